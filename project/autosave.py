@@ -0,0 +1,67 @@
+import threading
+
+
+# --- BACKGROUND AUTOSAVE ---
+class BackgroundSaver:
+    # Runs saves on a background thread so a turn never waits on the disk.
+    # Save requests that arrive while a write is in progress are merged: only the newest state is written.
+
+    def __init__(self, save_function):
+        # save_function(state, force_snapshot) does the actual (atomic) write
+        self.save_function = save_function
+        self.saves_requested = 0
+        self.saves_written = 0
+        self.last_error = None
+        self._pending = None
+        self._force_snapshot = False
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def request(self, state, force_snapshot=False):
+        # `state` must be a copy: the game keeps changing while the writer works
+        with self._condition:
+            self.saves_requested += 1
+            self._pending = state
+            self._force_snapshot = self._force_snapshot or force_snapshot
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        # Block until everything requested so far is on disk (load, delete, shutdown)
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending is None and not self._writing, timeout=timeout)
+        if self.last_error is not None:
+            error, self.last_error = self.last_error, None
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None and self._closed:
+                    return
+                state, self._pending = self._pending, None
+                force_snapshot, self._force_snapshot = self._force_snapshot, False
+                self._writing = True
+
+            try:
+                self.save_function(state, force_snapshot)
+                self.saves_written += 1
+            except Exception as e:
+                # Reported by the next flush(); the next request tries again with the newest state
+                self.last_error = e
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import platform
+import time
+import numpy as np
+from magic_spells import magic_spells
+from game_state import BASE_STATS, DIFFICULTY_PRESETS, DIFFICULTY_LEVELS
+from game_logic import ALLOCATABLE_STATS, xp_required
+from combat import (
+    ACTION_STAMINA_COST, BASE_DAMAGE, STRENGTH_DAMAGE, DEFENSE_REDUCTION, MIN_DAMAGE_TAKEN,
+    ENEMY_HEALTH, ENEMY_ATTACK, ENEMY_DEFENSE, ENEMY_XP, DIFFICULTY_ENEMY_SCALE,
+)
+
+
+# Monte-Carlo balance simulator: many characters per difficulty and stat allocation strategy are played
+# side by side, one turn at a time, as NumPy arrays (one entry per character). Each turn they fight with the
+# local combat rules (combat.py) or get what the narrator typically hands out (xp, traps, healing), level up
+# with the game's XP curve and spend their points. The output is the survival curve and the time to reach each
+# level, per difficulty and strategy, to tune the progression without playing against the model.
+#
+#   python balance.py
+#   python balance.py --characters 1000000 --turns 1000 --strategies strength caster
+
+RESULTS_DIR = "balance_results"
+
+# Where every point goes, in turn ("random": an even random pick per point)
+ALLOCATION_STRATEGIES = {
+    "balanced": ALLOCATABLE_STATS,
+    "strength": ("strength",),
+    "defense": ("defense",),
+    "bruiser": ("strength", "defense"),
+    "caster": ("intelligence", "magic"),
+    "random": None,
+}
+
+# What a turn outside a fight usually brings (the narrator's META), and how often a fight starts
+TURN_MODEL = {
+    "encounter_rate": 0.3,      # chance per turn out of a fight that an enemy appears
+    "enemy_level_spread": 1,    # enemy level = player level +- this
+    "story_xp": (0, 6),         # xp per turn out of a fight, uniform
+    "trap_rate": 0.1,           # chance of a trap/fall, damage before defense uniform in trap_damage
+    "trap_damage": (5, 20),
+    "heal_rate": 0.15,          # chance of healing (potion, rest), uniform in heal_amount
+    "heal_amount": (5, 20),
+}
+
+# Damage spells the caster strategy uses, strongest first: (name, damage, mana cost, required intelligence)
+DAMAGE_SPELLS = sorted(
+    (
+        (name, spell["combat"]["damage"], spell["mana_cost"], spell["required_intelligence"])
+        for name, spell in magic_spells.items() if spell.get("combat", {}).get("damage")
+    ),
+    key=lambda spell: -spell[1],
+)
+
+# Levels shown in the summary table
+SUMMARY_LEVELS = (2, 3, 5, 10)
+
+
+# --- XP CURVE ---
+def xp_curve():
+    # (base, step) of xp_required(level) = base + (level - 1) * step; the closed form below needs a linear curve
+    base = xp_required(1)
+    step = xp_required(2) - base
+    if any(xp_required(level) != base + (level - 1) * step for level in range(1, 200)):
+        raise ValueError("xp_required is not linear: level_for_xp needs a new closed form")
+    return base, step
+
+
+def xp_for_level(level, base, step):
+    # Total XP earned to reach `level` from level 1
+    k = level - 1
+    return base * k + step * k * (k - 1) // 2
+
+
+def level_for_xp(total_xp, base, step):
+    # The level check_level_up's loop ends at for `total_xp` earned since level 1, for a whole array at once:
+    # the largest k with base*k + step*k*(k-1)/2 <= total_xp, from the quadratic formula
+    b = base - step / 2
+    k = np.floor((-b + np.sqrt(b * b + 2 * step * total_xp)) / step).astype(np.int64)
+    # Float rounding can be one off near the boundaries
+    k -= xp_for_level(k + 1, base, step) > total_xp
+    k += xp_for_level(k + 2, base, step) <= total_xp
+    return k + 1
+
+
+# --- COMBAT FORMULAS (arrays) ---
+def damage_taken(damage, defense):
+    # combat.damage_taken for arrays
+    reduced = np.maximum(1, np.round(damage * np.maximum(MIN_DAMAGE_TAKEN, 1 - defense * DEFENSE_REDUCTION)))
+    return np.where(damage > 0, reduced, 0)
+
+
+# --- SIMULATION ---
+class Population:
+    # Every character of one difficulty/strategy run; arrays of length n
+
+    def __init__(self, n, difficulty, rng):
+        preset_stats, _ = DIFFICULTY_PRESETS[difficulty]
+        stats = dict(BASE_STATS)
+        stats.update(preset_stats)
+        stats.setdefault("health", stats["max_health"])
+        self.stats = {name: np.full(n, stats[name], dtype=np.float64) for name in ALLOCATABLE_STATS}
+        for name in ("max_health", "max_stamina", "max_mana"):
+            self.stats[name] = np.full(n, stats[name], dtype=np.float64)
+        self.health = np.full(n, stats["health"], dtype=np.float64)
+        self.stamina = self.stats["max_stamina"].copy()
+        self.mana = self.stats["max_mana"].copy()
+        # XP earned since level 1 (check_level_up keeps only the rest above the last level)
+        self.total_xp = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.xp_curve = xp_curve()
+        self.next_level_xp = np.full(n, xp_for_level(2, *self.xp_curve), dtype=np.int64)
+        self.points_spent = np.zeros(n, dtype=np.int64)
+        self.alive = np.ones(n, dtype=bool)
+        self.enemy_health = np.zeros(n)
+        self.enemy_attack = np.zeros(n)
+        self.enemy_defense = np.zeros(n)
+        self.enemy_xp = np.zeros(n, dtype=np.int64)
+        self.difficulty_scale = DIFFICULTY_ENEMY_SCALE[DIFFICULTY_LEVELS[difficulty]]
+        self.rng = rng
+
+    def spawn_enemies(self, index, spread):
+        # combat.make_enemy for the characters at `index`, around their own level
+        level = np.maximum(1, self.level[index] + self.rng.integers(-spread, spread + 1, size=len(index)))
+        self.enemy_health[index] = np.round((ENEMY_HEALTH[0] + ENEMY_HEALTH[1] * level) * self.difficulty_scale)
+        self.enemy_attack[index] = np.round((ENEMY_ATTACK[0] + ENEMY_ATTACK[1] * level) * self.difficulty_scale)
+        self.enemy_defense[index] = ENEMY_DEFENSE[0] + ENEMY_DEFENSE[1] * level
+        self.enemy_xp[index] = ENEMY_XP[0] + ENEMY_XP[1] * level
+
+    # Each step works on the indices of the characters it concerns: far cheaper than masking every array
+    def fight_round(self, caster):
+        # The player's spell or attack, then the enemy's attack if it is still standing (like resolve_combat).
+        # Returns the indices of the characters that fought.
+        fighting = np.flatnonzero(self.alive & (self.enemy_health > 0))
+        damage = np.empty(len(fighting))
+        casting = np.zeros(len(fighting), dtype=bool)
+        if caster:
+            mana, intelligence = self.mana[fighting], self.stats["intelligence"][fighting]
+            for _, spell_damage, mana_cost, required_intelligence in DAMAGE_SPELLS:
+                can_cast = ~casting & (mana >= mana_cost) & (intelligence >= required_intelligence)
+                damage[can_cast] = spell_damage
+                mana[can_cast] -= mana_cost
+                casting |= can_cast
+            self.mana[fighting] = mana
+        attacking = fighting[~casting]
+        stamina = self.stamina[attacking]
+        attack = BASE_DAMAGE + self.stats["strength"][attacking] * STRENGTH_DAMAGE
+        damage[~casting] = np.where(stamina < ACTION_STAMINA_COST, attack / 2, attack)
+        self.stamina[attacking] = np.maximum(0, stamina - ACTION_STAMINA_COST)
+
+        enemy_health = self.enemy_health[fighting]
+        enemy_health -= np.minimum(enemy_health, damage_taken(damage, self.enemy_defense[fighting]))
+        self.enemy_health[fighting] = enemy_health
+        defeated = fighting[enemy_health <= 0]
+        self.total_xp[defeated] += self.enemy_xp[defeated]
+
+        striking = fighting[enemy_health > 0]
+        self.health[striking] -= damage_taken(self.enemy_attack[striking], self.stats["defense"][striking])
+        return fighting
+
+    def story_turn(self, quiet, model):
+        # Outside a fight (indices `quiet`): the narrator's xp, traps (defense applies) and healing
+        rng, n = self.rng, len(quiet)
+        self.total_xp[quiet] += rng.integers(model["story_xp"][0], model["story_xp"][1] + 1, size=n)
+        trapped = quiet[rng.random(n) < model["trap_rate"]]
+        trap = rng.integers(model["trap_damage"][0], model["trap_damage"][1] + 1, size=len(trapped))
+        self.health[trapped] -= damage_taken(trap, self.stats["defense"][trapped])
+        healed = quiet[rng.random(n) < model["heal_rate"]]
+        heal = rng.integers(model["heal_amount"][0], model["heal_amount"][1] + 1, size=len(healed))
+        self.health[healed] = np.minimum(self.stats["max_health"][healed], self.health[healed] + heal)
+        # The narrator brings in an enemy for the next turn
+        self.spawn_enemies(quiet[rng.random(n) < model["encounter_rate"]], model["enemy_level_spread"])
+
+    def regenerate(self):
+        # regenerate_stamina / regenerate_mana: +5 / +2 a turn, up to the maximum
+        self.stamina = np.minimum(self.stats["max_stamina"], self.stamina + 5)
+        self.mana = np.minimum(self.stats["max_mana"], self.mana + 2)
+
+    def level_up(self):
+        # check_level_up without the loop, for the characters past their next level's XP:
+        # +10 max health and a full heal per level, one stat point per level
+        base, step = self.xp_curve
+        up = np.flatnonzero(self.alive & (self.total_xp >= self.next_level_xp))
+        level = level_for_xp(self.total_xp[up], base, step)
+        self.stats["max_health"][up] += 10 * (level - self.level[up])
+        self.health[up] = self.stats["max_health"][up]
+        self.level[up] = level
+        self.next_level_xp[up] = xp_for_level(level + 1, base, step)
+
+    def allocate(self, strategy):
+        # Spend every unassigned point (the game asks for them before the next turn), with assign_stat_point's
+        # bonuses: +5 max stamina per endurance point, +5 max mana per magic point (both refill)
+        leveled = np.flatnonzero(self.level - 1 > self.points_spent)
+        if not len(leveled):
+            return
+        earned, spent = self.level[leveled] - 1, self.points_spent[leveled]
+        cycle = ALLOCATION_STRATEGIES[strategy]
+        per_stat = {}
+        if cycle is None:
+            probabilities = np.full(len(ALLOCATABLE_STATS), 1 / len(ALLOCATABLE_STATS))
+            counts = self.rng.multinomial(earned - spent, probabilities)
+            per_stat = {stat: counts[:, i] for i, stat in enumerate(ALLOCATABLE_STATS)}
+        else:
+            # Point number p goes to cycle[p % len(cycle)]: count those numbers in [spent, earned)
+            m = len(cycle)
+            for i, stat in enumerate(cycle):
+                per_stat[stat] = per_stat.get(stat, 0) + (earned - i + m - 1) // m - (spent - i + m - 1) // m
+        for stat, count in per_stat.items():
+            self.stats[stat][leveled] += count
+        if "endurance" in per_stat:
+            self.stats["max_stamina"][leveled] += 5 * per_stat["endurance"]
+            refill = leveled[per_stat["endurance"] > 0]
+            self.stamina[refill] = self.stats["max_stamina"][refill]
+        if "magic" in per_stat:
+            self.stats["max_mana"][leveled] += 5 * per_stat["magic"]
+            refill = leveled[per_stat["magic"] > 0]
+            self.mana[refill] = self.stats["max_mana"][refill]
+        self.points_spent[leveled] = earned
+
+
+def simulate(difficulty, strategy, characters, turns, seed, model=TURN_MODEL, max_level=50):
+    # Survival and level reach per turn for one difficulty and allocation strategy
+    rng = np.random.default_rng(seed)
+    population = Population(characters, difficulty, rng)
+    caster = strategy == "caster"
+    survival = np.empty(turns)
+    # reached[t, level]: characters that got to `level` (or higher) by the end of turn t, dead or alive
+    reached = np.empty((turns, max_level + 1), dtype=np.int64)
+
+    for turn in range(turns):
+        fighting = population.fight_round(caster)
+        population.regenerate()
+        quiet = population.alive.copy()
+        quiet[fighting] = False
+        population.story_turn(np.flatnonzero(quiet), model)
+        population.level_up()
+        population.allocate(strategy)
+        population.alive &= population.health > 0
+        survival[turn] = population.alive.mean()
+        counts = np.bincount(np.minimum(population.level, max_level), minlength=max_level + 1)
+        reached[turn] = counts[::-1].cumsum()[::-1]
+
+    return summarize(survival, reached / characters, population)
+
+
+def _first_turn(curve, fraction):
+    # 1-based turn at which `curve` first reaches `fraction`, or None
+    index = int(np.argmax(curve >= fraction))
+    return index + 1 if curve[index] >= fraction else None
+
+
+def summarize(survival, reach, population):
+    # Time to level: percentiles over all characters (a character that died or never got there has no time)
+    time_to_level = {}
+    for level in range(2, reach.shape[1]):
+        final = float(reach[-1, level])
+        if final == 0:
+            break
+        time_to_level[level] = {
+            "reached": round(final, 4),
+            "p10": _first_turn(reach[:, level], 0.1),
+            "p50": _first_turn(reach[:, level], 0.5),
+            "p90": _first_turn(reach[:, level], 0.9),
+        }
+    alive_levels = population.level[population.alive]
+    return {
+        "survival": [round(float(value), 5) for value in survival],
+        "reach": {level: [round(float(value), 5) for value in reach[:, level]] for level in time_to_level},
+        "time_to_level": time_to_level,
+        # Turn by which half of the characters died
+        "half_life": _first_turn(1 - survival, 0.5),
+        "final_level_mean": round(float(population.level.mean()), 2),
+        "final_level_alive_mean": round(float(alive_levels.mean()), 2) if len(alive_levels) else None,
+    }
+
+
+# --- REPORT ---
+def format_results(data):
+    turns = data["meta"]["turns"]
+    checkpoints = sorted({max(1, turns // 10), turns // 4, turns // 2, turns})
+    header = f"{'difficulty':<12}{'strategy':<10}" + "".join(f"{f'alive@{t}':>12}" for t in checkpoints)
+    header += "".join(f"{f'L{level} p50':>10}" for level in SUMMARY_LEVELS) + f"{'level':>8}"
+    lines = [header]
+    for difficulty, by_strategy in data["results"].items():
+        for strategy, result in by_strategy.items():
+            row = f"{difficulty:<12}{strategy:<10}"
+            row += "".join(f"{result['survival'][t - 1]:>12.1%}" for t in checkpoints)
+            for level in SUMMARY_LEVELS:
+                p50 = result["time_to_level"].get(level, {}).get("p50")
+                row += f"{'-' if p50 is None else p50:>10}"
+            row += f"{result['final_level_mean']:>8.2f}"
+            lines.append(row)
+    lines.append("alive@N: characters alive after N turns; LN p50: turns until half of all characters reached level N")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte-Carlo balance simulation of leveling, combat and difficulty")
+    parser.add_argument("--characters", type=int, default=100_000, help="characters per difficulty and strategy")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--difficulties", nargs="+", choices=list(DIFFICULTY_PRESETS), default=list(DIFFICULTY_PRESETS))
+    parser.add_argument("--strategies", nargs="+", choices=list(ALLOCATION_STRATEGIES), default=list(ALLOCATION_STRATEGIES))
+    parser.add_argument("--encounter-rate", type=float, default=TURN_MODEL["encounter_rate"])
+    parser.add_argument("--story-xp", type=int, nargs=2, default=TURN_MODEL["story_xp"], metavar=("MIN", "MAX"), help="xp per turn out of a fight")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<date-time>.json)")
+    args = parser.parse_args()
+
+    model = dict(TURN_MODEL, encounter_rate=args.encounter_rate, story_xp=tuple(args.story_xp))
+    started = time.perf_counter()
+    results = {}
+    for difficulty in args.difficulties:
+        results[difficulty] = {}
+        for index, strategy in enumerate(args.strategies):
+            results[difficulty][strategy] = simulate(difficulty, strategy, args.characters, args.turns, args.seed + index, model)
+    elapsed = time.perf_counter() - started
+
+    data = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "characters": args.characters,
+            "turns": args.turns,
+            "seed": args.seed,
+            "turn_model": model,
+            "elapsed_s": round(elapsed, 3),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(data, f)
+
+    runs = len(args.difficulties) * len(args.strategies)
+    print(format_results(data))
+    print(f"{runs * args.characters * args.turns / elapsed / 1e6:.1f}M character-turns/s ({elapsed:.1f} s)")
+    print(f"💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
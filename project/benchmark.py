@@ -0,0 +1,262 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from item_stats import item_stat_boosts
+from magic_spells import magic_spells
+from game_logic import apply_meta_updates, calculate_total_stats, detect_equipment_slot, game_state_fields, handle_spell_casting
+from combat import add_enemies, resolve_combat
+from game_engine import GameSession, turn_prompt
+from intent_parser import describe_intent, parse_intent
+from mock_narrator import TemplateNarrator
+from simulate import quick_summary, random_action
+from stage_timings import StageTimings
+
+
+# Hot-path benchmarks at growing session lengths: one session is played (with the local template narrator)
+# up to each length in turn, and every benchmark runs against the game as it is at that point.
+# The results (count/mean/p50/p95/max per benchmark and length) go to a JSON file so runs can be compared;
+# the growth exponent between lengths shows paths that get slower with history (1 = linear, 2 = quadratic).
+#
+#   python benchmark.py
+#   python benchmark.py --lengths 10 100 1000 --compare benchmark_results/20260101-120000.json
+
+DEFAULT_LENGTHS = [10, 100, 1000, 10000]
+RESULTS_DIR = "benchmark_results"
+
+# A benchmark whose time grows faster than this between two lengths is flagged
+GROWTH_WARNING = 1.5
+
+
+# --- BENCHMARKS ---
+# Each one gets (session, rng, responses) and returns the function to time; copies of the state are made
+# outside the timed call so every run starts from the same game.
+def bench_prompt(session, rng, responses):
+    # The prompt construction in generate_story: recall + summaries + recent turns, then the turn suffix
+    state = session.state
+    player_input = random_action(rng)
+    intent_text = describe_intent(parse_intent(player_input))
+    memory = state.game_memory + [f"{state.player_name}: {player_input}"]
+
+    def run():
+        turn_prompt(state, session.build_recent_context(memory), player_input, intent_text)
+    return run
+
+
+def bench_apply_meta(session, rng, responses):
+    copy = session.state.snapshot()
+    response = rng.choice(responses)
+    return lambda: apply_meta_updates(copy, response)
+
+
+def bench_render(session, rng, responses):
+    # Everything the stats panel shows (the notebook and the server's view render from these fields)
+    return lambda: game_state_fields(session.state)
+
+
+def bench_save(session, rng, responses):
+    # Full snapshot (what every save rewrote before the journal, and what a save does every few turns)
+    return lambda: session.save(force_snapshot=True)
+
+
+def bench_save_delta(session, rng, responses):
+    # One journal record, like a turn's save (here only the gold changed)
+    player_stats = session.state.player_stats
+
+    def run():
+        player_stats["gold"] += 1
+        session.save()
+    return run
+
+
+def bench_load(session, rng, responses):
+    # A fresh session loading the save (snapshot + journal, state, summaries and recall index)
+    loader = GameSession(session.narrator, session.save_journal.save_file, summarize=quick_summary)
+    return loader.load
+
+
+def bench_detect_equipment_slot(session, rng, responses):
+    copy = session.state.snapshot()
+    item = rng.choice(list(item_stat_boosts))
+    return lambda: detect_equipment_slot(copy, item)
+
+
+def bench_handle_spell_casting(session, rng, responses):
+    copy = session.state.snapshot()
+    player_input = f"I cast {rng.choice(list(magic_spells))} at the goblin"
+
+    def run():
+        copy.player_stats["mana"] = copy.player_stats["max_mana"]
+        handle_spell_casting(copy, player_input)
+    return run
+
+
+def bench_combat(session, rng, responses):
+    # One turn of local combat against two enemies
+    copy = session.state.snapshot()
+    add_enemies(copy.combat, [{"name": "goblin", "level": 2}, {"name": "wolf", "level": 3}], copy.difficulty)
+    intent = parse_intent(random_action(rng))
+    totals = calculate_total_stats(copy)
+    return lambda: resolve_combat(copy, intent, totals)
+
+
+BENCHMARKS = {
+    "prompt": bench_prompt,
+    "apply_meta": bench_apply_meta,
+    "render": bench_render,
+    "save_snapshot": bench_save,
+    "save_delta": bench_save_delta,
+    "load": bench_load,
+    "detect_equipment_slot": bench_detect_equipment_slot,
+    "handle_spell_casting": bench_handle_spell_casting,
+    "combat": bench_combat,
+}
+
+
+def run_benchmark(name, session, rng, responses, timings, repeat, min_repeat, time_budget):
+    # Up to `repeat` runs, fewer (but at least `min_repeat`) if they take longer than `time_budget` seconds
+    started = time.perf_counter()
+    for i in range(repeat):
+        function = BENCHMARKS[name](session, rng, responses)
+        with timings.measure(name):
+            function()
+        if i + 1 >= min_repeat and time.perf_counter() - started > time_budget:
+            break
+
+
+# --- SESSION ---
+def advance(session, narrator, rng, turns, timings):
+    # Play `turns` more turns; each whole turn (without the narrator) is timed as "turn"
+    for _ in range(turns):
+        if session.state.awaiting_stat_allocation:
+            session.allocate_stat(rng.choice(["strength", "defense", "intelligence", "endurance", "magic"]))
+        turn = session.begin_turn(random_action(rng))
+        raw_output = narrator.generate(session.turn_prompt(turn))
+        started = time.perf_counter()
+        session.finish_turn(turn, apply_meta_updates(session.state, raw_output))
+        timings.add("turn", time.perf_counter() - started)
+        # Keep the character alive so long sessions don't end up at 0 health
+        session.state.player_stats["health"] = session.state.player_stats["max_health"]
+
+
+def growth_exponents(results, lengths):
+    # {benchmark: [exponent between each pair of lengths]}: log(time ratio) / log(length ratio)
+    exponents = {}
+    for name, by_length in results.items():
+        values = []
+        for shorter, longer in zip(lengths, lengths[1:]):
+            a, b = by_length[str(shorter)]["mean_us"], by_length[str(longer)]["mean_us"]
+            values.append(round(math.log(b / a) / math.log(longer / shorter), 2) if a > 0 and b > 0 else None)
+        exponents[name] = values
+    return exponents
+
+
+def run(args):
+    lengths = sorted(set(args.lengths))
+    rng = random.Random(args.seed)
+    narrator = TemplateNarrator(seed=args.seed)
+    # Realistic model responses for the META benchmark
+    responses = [narrator.generate("") for _ in range(200)]
+    save_dir = tempfile.mkdtemp(prefix="dungeon-bench-")
+    memory_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="story-memory")
+    session = GameSession(narrator, os.path.join(save_dir, "bench.json"), player_name="Bench",
+                          summarize=quick_summary, memory_executor=memory_executor)
+    session.save_journal.fsync = args.fsync
+    session.new_game("Medium")
+
+    results = {name: {} for name in ["turn"] + list(BENCHMARKS)}
+    played = 0
+    try:
+        for length in lengths:
+            timings = StageTimings()
+            advance(session, narrator, rng, length - played, timings)
+            played = length
+            # Background summaries finished, so they don't run during the measurements
+            session.story_memory.wait()
+            for name in BENCHMARKS:
+                run_benchmark(name, session, rng, responses, timings, args.repeat, args.min_repeat, args.time_budget)
+            report = timings.report()
+            # "turn": the last turns played to reach this length
+            for name in results:
+                results[name][str(length)] = report[name]
+            print(f"✅ {length} turns: {len(session.state.context)} characters of story")
+    finally:
+        memory_executor.shutdown(wait=True)
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lengths": lengths,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "fsync": args.fsync,
+        },
+        "results": results,
+        "growth_exponents": growth_exponents(results, lengths),
+    }
+
+
+# --- REPORT ---
+def format_results(data, previous=None):
+    lengths = data["meta"]["lengths"]
+    header = f"{'benchmark':<24}" + "".join(f"{f'{n} turns':>14}" for n in lengths) + f"{'growth':>20}"
+    lines = ["mean us per call", header]
+    for name, by_length in data["results"].items():
+        exponents = data["growth_exponents"][name]
+        row = f"{name:<24}" + "".join(f"{by_length[str(n)]['mean_us']:>14.1f}" for n in lengths)
+        row += f"{' '.join('-' if e is None else f'{e:.2f}' for e in exponents):>20}"
+        if any(e is not None and e > GROWTH_WARNING for e in exponents):
+            row += "  ⚠️ superlinear"
+        lines.append(row)
+
+    if previous:
+        # Ratio to an earlier run at the lengths both have (>1 is slower now)
+        lines += ["", "compared to " + previous["meta"]["created"]]
+        for name, by_length in data["results"].items():
+            before = previous["results"].get(name, {})
+            ratios = [
+                f"{n}: {by_length[str(n)]['mean_us'] / before[str(n)]['mean_us']:.2f}x"
+                for n in lengths if str(n) in before and before[str(n)]["mean_us"] > 0
+            ]
+            if ratios:
+                lines.append(f"{name:<24}" + "  ".join(ratios))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths at growing session lengths")
+    parser.add_argument("--lengths", type=int, nargs="+", default=DEFAULT_LENGTHS, help="session lengths in turns")
+    parser.add_argument("--repeat", type=int, default=200, help="runs per benchmark and length")
+    parser.add_argument("--min-repeat", type=int, default=5)
+    parser.add_argument("--time-budget", type=float, default=2.0, help="seconds per benchmark and length before stopping early")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fsync", action="store_true", help="fsync saves like the real game")
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<date-time>.json)")
+    parser.add_argument("--compare", help="an earlier results file to compare with")
+    args = parser.parse_args()
+
+    data = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(data, f, indent=2)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous = json.load(f)
+    print(format_results(data, previous))
+    print(f"💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+from magic_spells import magic_spells
+
+
+# Local combat rules: attacks, spells, enemy turns and rewards are worked out here from the player's equipped
+# totals, before the model is asked; the narrator only tells the story of the outcome (see the "Outcome" line
+# of the turn prompt). No dice: the same state and input always give the same result, so a retried model call
+# narrates the same fight.
+
+# --- RULES ---
+BASE_DAMAGE = 5
+STRENGTH_DAMAGE = 0.5
+# Each defense point takes 3% off incoming damage, down to at most MIN_DAMAGE_TAKEN of it
+DEFENSE_REDUCTION = 0.03
+MIN_DAMAGE_TAKEN = 0.25
+ACTION_STAMINA_COST = 10
+# Incoming damage multiplier for the player's stance this turn
+STANCE_DAMAGE_TAKEN = {"defend": 0.5, "dodge": 0.25}
+STANCE_NOTES = {"defend": "partly blocked", "dodge": "mostly dodged"}
+# Slowed enemies hit for half
+SLOWED_DAMAGE = 0.5
+
+# Enemy stats for a level, before the difficulty scale
+ENEMY_HEALTH = (20, 10)     # base, per level
+ENEMY_ATTACK = (4, 3)
+ENEMY_DEFENSE = (0, 1)
+ENEMY_XP = (5, 5)
+ENEMY_GOLD = (0, 2)
+# difficulty (1-3) -> multiplier for enemy health and attack
+DIFFICULTY_ENEMY_SCALE = {1: 0.8, 2: 1.0, 3: 1.25}
+MAX_ENEMIES = 6
+
+
+# --- COMBAT STATE ---
+def new_combat():
+    # Enemies in the current encounter and the player's timed effects
+    return {"enemies": [], "shield": 0, "shield_turns": 0, "hidden_turns": 0}
+
+
+def copy_combat(combat):
+    copy = dict(combat)
+    copy["enemies"] = [dict(enemy) for enemy in combat["enemies"]]
+    return copy
+
+
+def load_combat(data):
+    # Older saves have no combat state
+    combat = new_combat()
+    if data:
+        combat.update(data)
+        combat["enemies"] = [dict(enemy) for enemy in combat["enemies"]]
+    return combat
+
+
+def make_enemy(name, level, difficulty):
+    scale = DIFFICULTY_ENEMY_SCALE.get(difficulty, 1.0)
+    health = round((ENEMY_HEALTH[0] + ENEMY_HEALTH[1] * level) * scale)
+    return {
+        "name": name,
+        "level": level,
+        "health": health,
+        "max_health": health,
+        "attack": round((ENEMY_ATTACK[0] + ENEMY_ATTACK[1] * level) * scale),
+        "defense": ENEMY_DEFENSE[0] + ENEMY_DEFENSE[1] * level,
+        "xp": ENEMY_XP[0] + ENEMY_XP[1] * level,
+        "gold": ENEMY_GOLD[0] + ENEMY_GOLD[1] * level,
+        "slowed": 0,
+    }
+
+
+def add_enemies(combat, entries, difficulty, default_level=1):
+    # entries: [{"name": ..., "level": ...}] from the META block; two goblins become "goblin" and "goblin 2"
+    enemies = combat["enemies"]
+    for entry in entries:
+        if len(enemies) >= MAX_ENEMIES:
+            break
+        name = entry["name"].strip()
+        level = max(1, entry.get("level") or default_level)
+        taken = {enemy["name"].lower() for enemy in enemies}
+        unique, number = name, 2
+        while unique.lower() in taken:
+            unique, number = f"{name} {number}", number + 1
+        enemies.append(make_enemy(unique, level, difficulty))
+
+
+def remove_enemies(combat, names):
+    # Enemies that fled or gave up in the story
+    gone = {name.lower() for name in names}
+    combat["enemies"] = [enemy for enemy in combat["enemies"] if enemy["name"].lower() not in gone]
+
+
+def describe_enemies(combat):
+    # The "Enemies" line of the turn prompt: who is still fighting, so the narrator doesn't bring them in again
+    return ", ".join(f"{enemy['name']} ({enemy['health']}/{enemy['max_health']} HP)" for enemy in combat["enemies"])
+
+
+# --- FORMULAS ---
+def attack_damage(strength):
+    return BASE_DAMAGE + strength * STRENGTH_DAMAGE
+
+
+def damage_taken(damage, defense):
+    # Damage left after defense; at least 1 for any hit
+    if damage <= 0:
+        return 0
+    return max(1, round(damage * max(MIN_DAMAGE_TAKEN, 1 - defense * DEFENSE_REDUCTION)))
+
+
+def pick_target(enemies, targets):
+    # The enemy named in the input ("attack the wolf"; an exact name first), else the first one still standing
+    for target in targets:
+        for enemy in enemies:
+            if enemy["name"].lower() == target:
+                return enemy
+    for target in targets:
+        for enemy in enemies:
+            name = enemy["name"].lower()
+            if target in name or name in target:
+                return enemy
+    return enemies[0] if enemies else None
+
+
+# --- TURN RESOLUTION ---
+def resolve_combat(state, intent, totals, spell=None, exhausted=False):
+    # One turn of combat on `state`: the player's actions and spell, then every enemy's attack.
+    # totals: equipped stat totals (game_logic.calculate_total_stats); spell: a spell that was cast (mana paid).
+    # Returns the outcome (lines for the prompt and the player, damage, rewards) or None if nothing happened.
+    combat = state.combat
+    player_stats = state.player_stats
+    enemies = combat["enemies"]
+    if not enemies and spell is None:
+        return None
+
+    outcome = {"lines": [], "damage_dealt": 0, "damage_taken": 0, "healed": 0, "defeated": [], "xp": 0, "gold": 0, "fled": False}
+    lines = outcome["lines"]
+    actions = intent["actions"]
+    targets = [target.lower() for target in intent["targets"]]
+
+    def hit(enemy, amount, source):
+        dealt = min(enemy["health"], damage_taken(amount, enemy["defense"]))
+        enemy["health"] -= dealt
+        outcome["damage_dealt"] += dealt
+        lines.append(f"{source} hits the {enemy['name']} for {dealt} damage ({enemy['health']}/{enemy['max_health']} HP).")
+
+    def heal(amount):
+        healed = min(amount, player_stats["max_health"] - player_stats["health"])
+        player_stats["health"] += healed
+        outcome["healed"] += healed
+        return healed
+
+    # Player phase: the spell first, then the attack (twice with an extra action)
+    extra_actions = 0
+    if spell is not None:
+        effect = magic_spells[spell].get("combat", {})
+        if effect.get("damage"):
+            hit_all = effect.get("targets") == "all"
+            victims = enemies if hit_all else [pick_target(enemies, targets)]
+            dealt_before = outcome["damage_dealt"]
+            for enemy in victims:
+                if enemy is not None:
+                    hit(enemy, effect["damage"], spell)
+            if not enemies:
+                lines.append(f"{spell} strikes nothing: there is no enemy here.")
+            # Draining heals for what the spell took from the enemies: nothing without one
+            drained = outcome["damage_dealt"] - dealt_before
+            if effect.get("drain") and drained:
+                lines.append(f"{spell} heals you for {heal(drained)} HP.")
+        if effect.get("slow_turns") and enemies:
+            slowed = enemies if effect.get("targets") == "all" else [pick_target(enemies, targets)]
+            for enemy in slowed:
+                enemy["slowed"] = max(enemy["slowed"], effect["slow_turns"])
+            lines.append(f"{spell} slows {', '.join('the ' + enemy['name'] for enemy in slowed)} for {effect['slow_turns']} turn(s).")
+        if effect.get("heal"):
+            lines.append(f"{spell} heals you for {heal(effect['heal'])} HP.")
+        if effect.get("shield_defense"):
+            combat["shield"] = effect["shield_defense"]
+            combat["shield_turns"] = effect["shield_turns"]
+            lines.append(f"{spell} gives you +{effect['shield_defense']} defense for {effect['shield_turns']} turn(s).")
+        if effect.get("hidden_turns"):
+            combat["hidden_turns"] = max(combat["hidden_turns"], effect["hidden_turns"])
+            lines.append(f"{spell} keeps enemies from hitting you for {effect['hidden_turns']} turn(s).")
+        if effect.get("stamina"):
+            gained = min(effect["stamina"], player_stats["max_stamina"] - player_stats["stamina"])
+            player_stats["stamina"] += gained
+            lines.append(f"{spell} restores {gained} stamina.")
+        extra_actions = effect.get("extra_actions", 0)
+
+    if "attack" in actions:
+        for _ in range(1 + extra_actions):
+            enemy = pick_target([enemy for enemy in enemies if enemy["health"] > 0], targets)
+            if enemy is None:
+                break
+            damage = attack_damage(totals["strength"])
+            hit(enemy, damage / 2 if exhausted else damage, "Your exhausted attack" if exhausted else "Your attack")
+
+    # Defeated enemies leave the fight and pay out
+    for enemy in [enemy for enemy in enemies if enemy["health"] <= 0]:
+        enemies.remove(enemy)
+        outcome["defeated"].append(enemy["name"])
+        outcome["xp"] += enemy["xp"]
+        outcome["gold"] += enemy["gold"]
+        lines.append(f"The {enemy['name']} is defeated (+{enemy['xp']} XP, +{enemy['gold']} gold).")
+    player_stats["xp"] = player_stats.get("xp", 0) + outcome["xp"]
+    player_stats["gold"] = player_stats.get("gold", 0) + outcome["gold"]
+
+    # Enemy phase
+    stance = None if exhausted else next((action for action in ("dodge", "defend") if action in actions), None)
+    defense = totals["defense"] + (combat["shield"] if combat["shield_turns"] > 0 else 0)
+    for enemy in enemies:
+        if player_stats["health"] <= 0:
+            break
+        if combat["hidden_turns"] > 0:
+            lines.append(f"The {enemy['name']} can't find you.")
+        else:
+            damage = enemy["attack"] * STANCE_DAMAGE_TAKEN.get(stance, 1.0) * (SLOWED_DAMAGE if enemy["slowed"] else 1.0)
+            taken = min(player_stats["health"], damage_taken(damage, defense))
+            player_stats["health"] -= taken
+            outcome["damage_taken"] += taken
+            notes = ["slowed"] if enemy["slowed"] else []
+            if stance:
+                notes.append(STANCE_NOTES[stance])
+            lines.append(f"The {enemy['name']} hits you for {taken} damage" + (f" ({', '.join(notes)})." if notes else "."))
+        enemy["slowed"] = max(0, enemy["slowed"] - 1)
+    if outcome["damage_taken"] and player_stats["health"] <= 0:
+        lines.append("You collapse.")
+
+    # Running away works once the enemies had their strike, unless too exhausted to run
+    if "run" in actions and enemies:
+        if exhausted:
+            lines.append("You are too exhausted to get away.")
+        else:
+            outcome["fled"] = True
+            combat["enemies"] = []
+            lines.append("You get away from the fight.")
+
+    # Timed effects count down at the end of the turn
+    for key in ("shield_turns", "hidden_turns"):
+        combat[key] = max(0, combat[key] - 1)
+    if combat["shield_turns"] == 0:
+        combat["shield"] = 0
+    return outcome
+
+
+def describe_outcome(outcome):
+    # The "Outcome" line of the turn prompt
+    return " ".join(outcome["lines"])
@@ -0,0 +1,71 @@
+from array import array
+from item_stats import item_stat_boosts
+
+
+# --- STAT VECTORS ---
+# Fixed stat order for every vector below
+STAT_NAMES = ("strength", "defense", "intelligence", "endurance", "magic")
+STAT_INDEX = {name: i for i, name in enumerate(STAT_NAMES)}
+ZERO_VECTOR = array("i", [0] * len(STAT_NAMES))
+
+
+def encode_boosts(boosts):
+    vector = array("i", ZERO_VECTOR)
+    for stat, value in boosts.items():
+        if stat in STAT_INDEX:
+            vector[STAT_INDEX[stat]] = value
+    return vector
+
+
+# Every catalog item's boosts, encoded once
+ITEM_VECTORS = {item: encode_boosts(boosts) for item, boosts in item_stat_boosts.items()}
+
+
+def item_vector(item):
+    # Items the model invents (not in the catalog) give no boosts
+    return ITEM_VECTORS.get(item, ZERO_VECTOR)
+
+
+def equipment_vector(items):
+    total = array("i", ZERO_VECTOR)
+    for item in items:
+        if item:
+            for i, value in enumerate(item_vector(item)):
+                total[i] += value
+    return total
+
+
+# --- EQUIPMENT AGGREGATE ---
+class EquipmentStats:
+    # Sum of the boosts of everything equipped, kept up to date on every equip/unequip instead of
+    # walking all slots on every stat lookup
+
+    def __init__(self, equipment=None):
+        self.bonus = array("i", ZERO_VECTOR)
+        if equipment is not None:
+            self.rebuild(equipment)
+
+    def rebuild(self, equipment):
+        # After loading a save or starting a new game
+        self.bonus = equipment_vector(equipment.values())
+
+    def copy(self):
+        clone = EquipmentStats()
+        clone.bonus = array("i", self.bonus)
+        return clone
+
+    def set_slot(self, equipment, slot, item):
+        # Put `item` (or None) in `slot` and update the bonus with the difference
+        old_vector = item_vector(equipment.get(slot)) if equipment.get(slot) else ZERO_VECTOR
+        new_vector = item_vector(item) if item else ZERO_VECTOR
+        for i in range(len(STAT_NAMES)):
+            self.bonus[i] += new_vector[i] - old_vector[i]
+        equipment[slot] = item
+
+    def bonus_for(self, stat_name):
+        index = STAT_INDEX.get(stat_name)
+        return self.bonus[index] if index is not None else 0
+
+    def totals(self, player_stats):
+        # All totals (base + equipment) at once
+        return {name: player_stats.get(name, 0) + self.bonus[i] for i, name in enumerate(STAT_NAMES)}
@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+import ipywidgets as widgets
+from IPython.display import display
+
+
+# --- MARKDOWN OUTPUT HELPERS ---
+def markdown_bundle(text):
+    # A ready-made display message, so widget outputs can be set without going through display()
+    return {"output_type": "display_data", "data": {"text/markdown": text, "text/plain": text}, "metadata": {}}
+
+
+def markdown_widget(text=""):
+    output = widgets.Output()
+    if text:
+        output.outputs = (markdown_bundle(text),)
+    return output
+
+
+# --- GAME VIEW ---
+class GameView:
+    # Persistent game screen that is updated in place instead of cleared and redrawn:
+    # - the story pane is append-only (one small widget per paragraph, grouped in pages so appending
+    #   a paragraph only syncs the last page's child list, never the whole story)
+    # - every stats field is its own widget and is only re-sent when its text changed
+    # - renders requested inside `batch()` are merged into one at the end
+
+    def __init__(self, field_names, page_size=50):
+        self.field_names = list(field_names)
+        self.page_size = page_size
+
+        self.story_title = markdown_widget()
+        self.story_pane = widgets.VBox()
+        self.live_paragraph = widgets.Output()
+        self.fields = {name: widgets.Output() for name in self.field_names}
+        self.messages = widgets.VBox()
+        self.controls = widgets.VBox()
+        self.widget = widgets.VBox(
+            [self.story_title, self.story_pane, self.live_paragraph]
+            + [self.fields[name] for name in self.field_names]
+            + [self.messages, self.controls]
+        )
+
+        self._field_text = {}
+        self._story = ""
+        self._page = None
+        self._shown_in = None
+        self._batch_depth = 0
+        self._pending_render = None
+
+    # --- DISPLAY ---
+    def show(self, output_area):
+        # The view is displayed once; after that only its widgets change
+        if self._shown_in is not output_area:
+            output_area.clear_output()
+            with output_area:
+                display(self.widget)
+            self._shown_in = output_area
+
+    def reset(self):
+        # Empty screen (new game, deleted save)
+        self.story_title.outputs = ()
+        self.story_pane.children = ()
+        self.live_paragraph.outputs = ()
+        for field in self.fields.values():
+            field.outputs = ()
+        self.messages.children = ()
+        self.controls.children = ()
+        self._field_text = {}
+        self._story = ""
+        self._page = None
+
+    # --- RENDER BATCHING ---
+    @contextmanager
+    def batch(self):
+        # Renders requested inside the block are merged into a single render at the end
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._pending_render is not None:
+                render, self._pending_render = self._pending_render, None
+                render()
+
+    def render(self, render_function):
+        if self._batch_depth > 0:
+            self._pending_render = render_function
+        else:
+            render_function()
+
+    # --- STORY PANE ---
+    def set_story(self, title, story):
+        if not self.story_title.outputs:
+            self.story_title.outputs = (markdown_bundle(title),)
+
+        if story.startswith(self._story):
+            # The story only grew: add the new part as new paragraph(s)
+            new_text = story[len(self._story):].strip()
+            if new_text:
+                self._append_paragraph(new_text)
+        else:
+            # Different story (loaded or new game): rebuild the pane once
+            self.story_pane.children = ()
+            self._page = None
+            if story.strip():
+                self._append_paragraph(story.strip())
+        self._story = story
+
+    def _append_paragraph(self, text):
+        if self._page is None or len(self._page.children) >= self.page_size:
+            self._page = widgets.VBox()
+            self.story_pane.children += (self._page,)
+        self._page.children += (markdown_widget(text),)
+
+    def history_bytes(self):
+        # Text held by the story pane's output widgets (each paragraph is kept as markdown and as plain text)
+        return sum(
+            len(value.encode("utf-8"))
+            for page in self.story_pane.children
+            for paragraph in page.children
+            for output in paragraph.outputs
+            for value in output["data"].values()
+        )
+
+    def stream_paragraph(self, text):
+        # The paragraph that is still being generated; replaced on every chunk
+        self.live_paragraph.outputs = (markdown_bundle(text),)
+
+    def end_stream(self):
+        self.live_paragraph.outputs = ()
+
+    # --- STATS PANEL ---
+    def set_fields(self, field_text):
+        for name, text in field_text.items():
+            if self._field_text.get(name) != text:
+                self._field_text[name] = text
+                self.fields[name].outputs = (markdown_bundle(text),)
+
+    # --- MESSAGES AND CONTROLS ---
+    def message(self, text):
+        self.messages.children += (markdown_widget(text),)
+
+    def clear_messages(self):
+        self.messages.children = ()
+
+    def set_controls(self, *controls):
+        if tuple(self.controls.children) != controls:
+            self.controls.children = controls
@@ -0,0 +1,482 @@
+import asyncio
+import functools
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from globals_variables import (
+    memory_cap, prompt_token_budget, retrieval_top_k, retrieval_token_cap, save_snapshot_every,
+    model_name, use_context_cache, cache_model_name, context_cache_ttl_minutes,
+    model_deadline_seconds, model_max_retries, model_hedge_requests,
+    model_requests_per_minute, model_tokens_per_minute, model_max_concurrent, model_expected_output_tokens,
+)
+from prompt_builder import build_turn_prompt
+from model_client import ModelClient, StoryGenerationError
+from request_scheduler import RequestScheduler
+from meta_stream import MetaStreamSplitter
+from save_journal import SaveJournal
+from autosave import BackgroundSaver
+from story_memory import StoryMemory, estimate_tokens
+from memory_index import MemoryIndex, tokenize
+from intent_parser import describe_intent
+from game_state import GameState, DIFFICULTY_LEVELS
+from combat import copy_combat, describe_enemies
+from telemetry import TurnRecord
+from game_logic import (
+    assign_stat_point, apply_meta_updates, apply_split_response, apply_turn_costs, auto_equip, game_state_fields
+)
+
+
+# --- STORY CLIENT ---
+def make_story_client():
+    # Gemini client with the settings from globals_variables.py (genai must be configured with the API key first).
+    # Its scheduler keeps every session of the process within the API quota.
+    scheduler = RequestScheduler(model_requests_per_minute, model_tokens_per_minute, max_concurrent=model_max_concurrent)
+    return ModelClient(
+        model_name,
+        use_context_cache=use_context_cache,
+        cache_model_name=cache_model_name,
+        cache_ttl_minutes=context_cache_ttl_minutes,
+        deadline=model_deadline_seconds,
+        max_retries=model_max_retries,
+        hedge_requests=model_hedge_requests,
+        scheduler=scheduler,
+        expected_output_tokens=model_expected_output_tokens,
+    )
+
+
+# --- TURN PROMPT ---
+def turn_prompt(state, recent_context, player_input, intent_text="", combat_text=""):
+    # prompt for the AI: the static rules/catalog prefix lives on the model, only the turn suffix is sent
+    return build_turn_prompt(
+        recent_context, state.player_name, player_input, state.difficulty,
+        state.player_stats, state.inventory, state.equipment, intent_text, combat_text, describe_enemies(state.combat)
+    )
+
+
+# --- GAME SESSION ---
+class GameSession:
+    # One player's game without any UI: the GameState plus its story memory, recall index and save files.
+    # The notebook drives one session (game_configuration.py), the server many (GameEngine below).
+    # Not thread safe: one turn/command at a time per session.
+
+    def __init__(self, narrator, save_file, player_name=None, summarize=None, memory_executor=None, background_save=False,
+                 telemetry=None, session_id=None, memory_profiler=None):
+        # narrator: generate(prompt) -> text, optionally stream(prompt) -> chunks (ModelClient or a local stand-in)
+        self.narrator = narrator
+        # Per-turn timings/sizes/tokens go to `telemetry` (see telemetry.py), if given
+        self.telemetry = telemetry
+        self.session_id = session_id
+        # Opt-in memory-growth sampling every few turns (see memory_profile.py)
+        self.memory_profiler = memory_profiler
+        self.state = GameState(player_name)
+        # Rolling summaries + key facts + recent turns, within a fixed token budget for every prompt.
+        # Summaries queue behind the players' turns (they fall back to an extractive summary if they give up)
+        if summarize is None:
+            summarize = narrator.generate
+            if getattr(narrator, "reports_usage", False):
+                summarize = functools.partial(narrator.generate, session=session_id, priority="summary")
+        self.story_memory = StoryMemory(summarize, memory_cap=memory_cap, executor=memory_executor)
+        # Lexical index over every narration and player input, to bring back older events the summaries lost
+        self.memory_index = MemoryIndex()
+        # Snapshot + append-only journal with one small record per turn
+        self.save_journal = SaveJournal(save_file, snapshot_every=save_snapshot_every)
+        # Saves on a background thread (notebook), or right away in the calling thread (server workers)
+        self.autosaver = None
+        if background_save:
+            self.autosaver = BackgroundSaver(lambda data, force_snapshot: self.save_journal.save(data, force_snapshot=force_snapshot))
+
+    # --- PROMPT CONTEXT ---
+    def build_recent_context(self, memory):
+        # Older passages that match the current input/situation, then summaries + recent turns in what's left
+        query = " ".join(memory[-2:])
+        recalled = self.memory_index.recall(query, retrieval_top_k, retrieval_token_cap, exclude=set(memory))
+        if not recalled:
+            return self.story_memory.build_context(memory, prompt_token_budget)
+        budget = prompt_token_budget - estimate_tokens(recalled)
+        return recalled + "\n\n" + self.story_memory.build_context(memory, budget)
+
+    def turn_prompt(self, turn):
+        record = turn["telemetry"]
+        with record.measure("prompt"):
+            prompt = turn_prompt(self.state, turn["recent_context"], turn["player_input"], turn["intent_text"], turn["combat_text"])
+        record.data["prompt_chars"] = len(prompt)
+        record.data["prompt_tokens_estimated"] = estimate_tokens(prompt)
+        return prompt
+
+    def preview_prompt(self, player_input):
+        # Prompt the next turn would send for `player_input`, built on a copy of the game (speculative prefetch)
+        preview = self.state.snapshot()
+        _, _, intent, combat_text = apply_turn_costs(preview, player_input)
+        recent_context = self.build_recent_context(preview.game_memory + [f"{preview.player_name}: {player_input}"])
+        return turn_prompt(preview, recent_context, player_input, describe_intent(intent), combat_text)
+
+    # --- NEW GAME ---
+    def new_game(self, difficulty_choice):
+        if not self.state.player_name:
+            raise ValueError("A player name is needed to start a game.")
+        if difficulty_choice not in DIFFICULTY_LEVELS:
+            raise ValueError(f"Unknown difficulty: {difficulty_choice}")
+        self.state.new_game(difficulty_choice)
+        self.story_memory.reset()
+        self.memory_index.rebuild([self.state.context], ignore_words=tokenize(self.state.player_name))
+        self.save(force_snapshot=True)
+
+    # --- GAME TURN ---
+    def begin_turn(self, player_input):
+        # Everything that happens before the model is asked; returns None if there is no turn to play
+        state = self.state
+        if state.awaiting_stat_allocation or not player_input.strip():
+            return None
+
+        record = TurnRecord()
+        with record.measure("input"):
+            # Remember the stats and the fight so a failed model call doesn't leave half a turn behind
+            stats_before_turn = state.player_stats.copy()
+            combat_before_turn = copy_combat(state.combat)
+            stamina_lost, spell_result, intent, combat_text = apply_turn_costs(state, player_input)
+            intent_text = describe_intent(intent)
+
+        state.game_memory.append(f"{state.player_name}: {player_input}")
+        with record.measure("prompt"):
+            recent_context = self.build_recent_context(state.game_memory)
+        return {
+            "player_input": player_input,
+            "stats_before_turn": stats_before_turn,
+            "combat_before_turn": combat_before_turn,
+            "stamina_lost": stamina_lost,
+            "spell_result": spell_result,
+            "intent_text": intent_text,
+            "combat_text": combat_text,
+            "recent_context": recent_context,
+            "telemetry": record,
+        }
+
+    def call_narrator(self, turn, method, prompt):
+        # The real model also reports this call's retries and token counts into the turn's record,
+        # and queues it fairly with the other sessions' turns
+        if getattr(self.narrator, "reports_usage", False):
+            return method(prompt, usage=turn["telemetry"].usage, session=self.session_id)
+        return method(prompt)
+
+    def narrate(self, turn, on_chunk=None):
+        # Ask the narrator and apply the META block; on_chunk(text) gets the story as it streams in
+        record = turn["telemetry"]
+        prompt = self.turn_prompt(turn)
+        model_started = time.perf_counter()
+        if on_chunk is None or not hasattr(self.narrator, "stream"):
+            with record.measure("model"):
+                raw_output = self.call_narrator(turn, self.narrator.generate, prompt)
+            record.first_token(model_started)
+            record.data["response_chars"] = len(raw_output)
+            with record.measure("meta"):
+                return apply_meta_updates(self.state, raw_output)
+
+        splitter = MetaStreamSplitter()
+        response_chars = 0
+        with record.measure("model"):
+            for chunk in self.call_narrator(turn, self.narrator.stream, prompt):
+                record.first_token(model_started)
+                response_chars += len(chunk)
+                visible = splitter.feed(chunk)
+                if visible:
+                    on_chunk(visible)
+        record.data["response_chars"] = response_chars
+        with record.measure("meta"):
+            splitter.close()
+            return apply_split_response(self.state, splitter).strip()
+
+    def rollback_turn(self, turn):
+        # Roll back the turn: nothing is added to the story and nothing is saved
+        self.state.game_memory.pop()
+        self.state.player_stats = turn["stats_before_turn"]
+        self.state.combat = turn["combat_before_turn"]
+        # A turn only starts with no stat points to spend; a level up from the rolled back fight is undone too
+        self.state.awaiting_stat_allocation = False
+
+    def finish_turn(self, turn, cleaned_output):
+        # Returns True if the player leveled up this turn
+        state = self.state
+        record = turn["telemetry"]
+        with record.measure("state"):
+            state.context += f"\n\n{cleaned_output}"
+            state.game_memory.append(cleaned_output)
+            self.memory_index.add(state.game_memory[-2])
+            self.memory_index.add(cleaned_output)
+            # Cap game_memory; older turns are folded into the rolling summaries in the background
+            state.memory_start += self.story_memory.trim(state.game_memory)
+        with record.measure("save"):
+            self.save()
+        return state.player_stats.get("level", 1) > turn["stats_before_turn"].get("level", 1)
+
+    def record_turn(self, turn, error=None):
+        # Called once the turn is shown (after "render"), or after it failed
+        if self.memory_profiler is not None and error is None:
+            self.memory_profiler.turn_played()
+        if self.telemetry is None:
+            return
+        record = turn["telemetry"]
+        record.data.update(
+            session=self.session_id, player=self.state.player_name, context_chars=len(self.state.context), error=error,
+        )
+        self.telemetry.record(record)
+
+    def play_turn(self, player_input, on_chunk=None):
+        # A whole turn; returns the view plus the turn's story and messages
+        if self.state.awaiting_stat_allocation:
+            return self.view(messages=["⚠️ You must assign your unspent stat point(s) before continuing."])
+        turn = self.begin_turn(player_input)
+        if turn is None:
+            return self.view()
+
+        try:
+            cleaned_output = self.narrate(turn, on_chunk)
+        except StoryGenerationError as e:
+            self.rollback_turn(turn)
+            self.record_turn(turn, error=str(e))
+            return self.view(
+                messages=[f"❌ **The narrator could not answer:** {e}  \nYour action was not applied, try again."],
+                error=str(e),
+            )
+        leveled_up = self.finish_turn(turn, cleaned_output)
+
+        messages = []
+        if turn["stamina_lost"]:
+            messages.append(f"💨 **You lose 10 stamina** from {player_input}.")
+        if leveled_up:
+            messages.append(f"🎉 **Level Up!** {self.state.player_name} reached level {self.state.player_stats.get('level', 1)}!")
+        if turn["spell_result"]:
+            messages.append(turn["spell_result"])
+        if turn["combat_text"]:
+            messages.append(f"⚔️ {turn['combat_text']}")
+        with turn["telemetry"].measure("render"):
+            view = self.view(story=cleaned_output, messages=messages)
+        self.record_turn(turn)
+        return view
+
+    # --- STAT ALLOCATION ---
+    def allocate_stat(self, stat):
+        remaining = assign_stat_point(self.state, stat.lower())
+        self.save()
+        return self.view(messages=[f"🧠 **Stat allocation complete!** {remaining} stat point(s) left."])
+
+    # --- AUTO-EQUIP ---
+    def auto_equip(self, profile):
+        # Best owned gear for "melee", "caster" or "tank", worked out locally (no model call)
+        swaps = auto_equip(self.state, profile)
+        if not swaps:
+            return self.view(messages=[f"🧰 You already wear the best gear for _{profile}_."])
+        self.save()
+        changes = "\n".join(f"- {slot}: {old or 'nothing'} → {new or 'nothing'}" for slot, old, new in swaps)
+        return self.view(messages=[f"🧰 **Auto-equip ({profile}):**\n{changes}"])
+
+    # --- SAVE / LOAD / DELETE ---
+    def save(self, force_snapshot=False):
+        # A journal record with what changed, or a full snapshot every few turns
+        # (copies, because a background writer runs while the next turn already changes the state)
+        data = self.state.to_save_dict()
+        data["story_memory"] = self.story_memory.to_dict()
+        # The index's passages only grow, so the live list goes along with its current length and the journal
+        # writes only the ones it hasn't seen (rebuild() starts a new list, it never changes this one)
+        data["memory_passages"] = self.memory_index.passages
+        data["memory_passages_length"] = len(self.memory_index.passages)
+        if self.autosaver is not None:
+            self.autosaver.request(data, force_snapshot=force_snapshot)
+        else:
+            self.save_journal.save(data, force_snapshot=force_snapshot)
+
+    def flush(self):
+        if self.autosaver is not None:
+            self.autosaver.flush()
+
+    def load(self):
+        # Latest snapshot + the journal written after it (after any save still in flight); False if there is no save
+        self.flush()
+        if not self.save_journal.exists():
+            return False
+        data = self.save_journal.load()
+        self.state.load_save_dict(data)
+        self.story_memory.load(data.get("story_memory", {}))
+        # The index gets back the same passages it had (older saves only have the story text to rebuild it from)
+        ignore_words = tokenize(self.state.player_name or "")
+        if "memory_passages" in data:
+            self.memory_index.rebuild(data["memory_passages"], ignore_words)
+        else:
+            self.memory_index.rebuild(self.state.context.split("\n\n"), ignore_words)
+        self.state.memory_start += self.story_memory.trim(self.state.game_memory)
+        return True
+
+    def delete_save(self):
+        # After any save still in flight, so it isn't written again
+        self.flush()
+        self.save_journal.delete()
+
+    def close(self):
+        if self.autosaver is not None:
+            self.autosaver.close()
+
+    # --- VIEW ---
+    def view(self, story=None, messages=(), error=None):
+        # JSON-ready picture of the game for clients: the same fields the notebook shows
+        state = self.state
+        result = {
+            "player_name": state.player_name,
+            "started": bool(state.context),
+            "awaiting_stat_allocation": state.awaiting_stat_allocation,
+            "unassigned_stat_points": state.player_stats.get("unassigned_stat_points", 0),
+            "fields": game_state_fields(state) if state.context else {},
+            "messages": list(messages),
+        }
+        if story is not None:
+            result["story"] = story
+        if error is not None:
+            result["error"] = error
+        return result
+
+
+# --- GAME ENGINE ---
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class UnknownSessionError(KeyError):
+    pass
+
+
+class GameEngine:
+    # Many isolated GameSessions in one process behind an async API.
+    # Commands for one session run one at a time (a lock per session); different sessions run side by side
+    # on a worker pool, so a slow model call only holds up its own player.
+    # Sessions live in memory up to `max_sessions`; the least recently used idle one is then saved and dropped,
+    # and opened again from its save file on the next command.
+
+    def __init__(self, narrator, save_dir="saves", max_sessions=1000, max_workers=64, memory_workers=4, telemetry=None):
+        self.narrator = narrator
+        # One Telemetry for all sessions: GET /metrics shows the whole process
+        self.telemetry = telemetry
+        self.save_dir = save_dir
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self._locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="game-turn")
+        # One summary pool for every session instead of a thread per session
+        self._memory_executor = ThreadPoolExecutor(max_workers=memory_workers, thread_name_prefix="story-memory")
+        os.makedirs(save_dir, exist_ok=True)
+
+    def save_file(self, session_id):
+        return os.path.join(self.save_dir, f"{session_id}.json")
+
+    def _lock(self, session_id):
+        if not SESSION_ID_PATTERN.match(session_id or ""):
+            raise UnknownSessionError(session_id)
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def _new_session(self, session_id, player_name=None):
+        return GameSession(
+            self.narrator, self.save_file(session_id), player_name=player_name,
+            memory_executor=self._memory_executor, telemetry=self.telemetry, session_id=session_id,
+        )
+
+    async def _open(self, session_id):
+        # In memory, or back from its save file (called with the session's lock held)
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self._new_session(session_id)
+            if not await asyncio.get_running_loop().run_in_executor(self._executor, session.load):
+                self._locks.pop(session_id, None)
+                raise UnknownSessionError(session_id)
+            self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def _run(self, session_id, command, *args):
+        # Run `command(session, *args)` on the worker pool, one command at a time per session
+        async with self._lock(session_id):
+            session = await self._open(session_id)
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(command, session, *args)
+            )
+        await self._evict()
+        return result
+
+    async def _evict(self):
+        # Pick the victims before awaiting anything, so concurrent evictions don't pick the same session
+        victims = []
+        for session_id in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            lock = self._locks.get(session_id)
+            if lock is not None and lock.locked():
+                continue
+            victims.append(self.sessions.pop(session_id))
+            self._locks.pop(session_id, None)
+        for session in victims:
+            await asyncio.get_running_loop().run_in_executor(self._executor, session.close)
+
+    # --- ASYNC API ---
+    async def create_session(self, player_name, session_id=None):
+        # session_id is picked by the caller when sessions are routed to worker processes (see game_cluster.py)
+        if not player_name or not player_name.strip():
+            raise ValueError("A player name is needed to start a game.")
+        session_id = session_id or uuid.uuid4().hex
+        self._lock(session_id)
+        self.sessions[session_id] = self._new_session(session_id, player_name.strip())
+        return session_id
+
+    async def new_game(self, session_id, difficulty_choice="Medium"):
+        def command(session):
+            session.new_game(difficulty_choice)
+            return session.view(messages=[f"**New game started on _{difficulty_choice}_ difficulty.**"])
+        return await self._run(session_id, command)
+
+    async def play_turn(self, session_id, player_input, on_chunk=None):
+        # on_chunk(text) is called from a worker thread while the story streams in
+        return await self._run(session_id, GameSession.play_turn, player_input, on_chunk)
+
+    async def allocate_stat(self, session_id, stat):
+        return await self._run(session_id, GameSession.allocate_stat, stat)
+
+    async def auto_equip(self, session_id, profile):
+        return await self._run(session_id, GameSession.auto_equip, profile)
+
+    async def save(self, session_id):
+        def command(session):
+            session.save(force_snapshot=True)
+            return session.view(messages=["💾 Game saved."])
+        return await self._run(session_id, command)
+
+    async def load(self, session_id):
+        def command(session):
+            session.load()
+            return session.view(messages=["✅ **Game loaded successfully!**"])
+        return await self._run(session_id, command)
+
+    async def view(self, session_id):
+        return await self._run(session_id, GameSession.view)
+
+    async def delete_save(self, session_id):
+        # Ends the session too: without a save file it can't be opened again
+        await self._run(session_id, GameSession.delete_save)
+        await self.close_session(session_id)
+
+    async def metrics(self):
+        # TurnMetrics snapshot of every turn played in this process (see telemetry.prometheus_text)
+        if self.telemetry is None:
+            return {"counters": {}, "histograms": {}}
+        return self.telemetry.metrics.snapshot()
+
+    async def close_session(self, session_id):
+        async with self._lock(session_id):
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                await asyncio.get_running_loop().run_in_executor(self._executor, session.close)
+        self._locks.pop(session_id, None)
+
+    async def close(self):
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        self._executor.shutdown(wait=True)
+        self._memory_executor.shutdown(wait=True)
+        if self.telemetry is not None:
+            self.telemetry.close()
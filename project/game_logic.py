@@ -0,0 +1,401 @@
+from item_stats import item_stat_boosts
+from magic_spells import magic_spells
+from meta_stream import MetaStreamSplitter
+from slot_classifier import classify_item_slot
+from equipment_stats import item_vector
+from intent_parser import parse_intent, stamina_action
+from loadout import plan_changes, solve_loadout
+from combat import ACTION_STAMINA_COST, add_enemies, damage_taken, describe_outcome, remove_enemies, resolve_combat
+
+
+# Game rules. Every function works on the GameState it is given (see game_state.py), none of them touch the UI.
+
+
+# --- AvAILABLE SPELLS ---
+def print_available_spells(player_intelligence):
+    # Filter and collect spells the player can cast
+    available_spells = [
+        (name, details["mana_cost"])
+        for name, details in magic_spells.items()
+        if player_intelligence >= details["required_intelligence"]
+    ]
+
+    # Print the available spells
+    if available_spells:
+        for name, mana_cost in available_spells:
+            return f"- {name} (Mana Cost: {mana_cost})"
+    else:
+        return "No spells available with the current intelligence."
+
+
+
+# --- TRACK STAMINA LOSS DURING ACTIONS ---
+def handle_stamina_loss(state, action_type):
+    player_stats = state.player_stats
+
+    if action_type in ["attack", "run", "defend", "dodge"]:
+        # Deduct stamina when attacking, running, defending, or dodging
+        player_stats["stamina"] = max(0, player_stats["stamina"] - ACTION_STAMINA_COST)
+        return True
+    return False
+
+
+# --- REGENERATE STAMINA ---
+def regenerate_stamina(state):
+    player_stats = state.player_stats
+    max_stamina = player_stats.get("max_stamina", 100)
+    current_stamina = player_stats.get("stamina", 0)
+
+    if current_stamina < max_stamina:
+        # If the player is within 5 stamina points of max stamina, regenerate only what is needed.
+        if max_stamina - current_stamina <= 5:
+            player_stats["stamina"] = max_stamina
+        else:
+            player_stats["stamina"] = min(current_stamina + 5, max_stamina)
+
+
+# --- CAST MAGIC SPELL ---
+def handle_spell_casting(state, player_input, intent=None):
+    # Check if the player input contains a spell name (whole words, the first spell typed wins)
+    if intent is None:
+        intent = parse_intent(player_input)
+    # If no spell is found in the input
+    if not intent["spells"]:
+        return None
+    return cast_spell(state, intent["spells"][0])[1]
+
+
+def cast_spell(state, spell_name):
+    # Returns (cast, message): cast is False if the player lacks the intelligence or the mana
+    player_stats = state.player_stats
+    spell = magic_spells[spell_name]
+    # Check intelligence requirement first
+    req_int = spell.get("required_intelligence", 0)
+    if player_stats.get("intelligence", 0) < req_int:
+        return False, (
+            f"❌ You need at least {req_int} intelligence "  \
+            f"to cast _{spell_name}_. You have {player_stats.get('intelligence', 0)}."
+        )
+    # Check mana next
+    mana_cost = spell["mana_cost"]
+    if player_stats["mana"] < mana_cost:
+        return False, (
+            f"❌ Not enough mana to cast _{spell_name}_! "  \
+            f"You need {mana_cost}, but only have {player_stats['mana']}."
+        )
+    # Deduct mana and cast
+    player_stats["mana"] -= mana_cost
+    return True, (
+        f"✨ **You cast _{spell_name}_**!\n"
+        f"Effect: {spell['effect']}\n"
+        f"🪄 Mana remaining: {player_stats['mana']}"
+    )
+
+
+# --- REGENERATE MANA ---
+def regenerate_mana(state):
+    player_stats = state.player_stats
+    max_mana = player_stats.get("max_mana", 50)
+    current_mana = player_stats.get("mana", 0)
+
+    if current_mana < max_mana:
+        # If the player is within 2 mana points of max, regenerate only what is needed
+        if max_mana - current_mana <= 2:
+            player_stats["mana"] = max_mana
+        else:
+            player_stats["mana"] = min(current_mana + 2, max_mana)
+
+
+
+# --- EQUIPMENT SLOT DETECTION ---
+def detect_equipment_slot(state, item_name):
+    equipment = state.equipment
+    # Catalog items by exact name, other names by their keywords (see slot_classifier.py)
+    slot = classify_item_slot(item_name)
+
+    # Accessories (ring, amulet, necklace, charm, locket)
+    if slot == "accessory":
+        if not equipment["accessory_1"]:
+            return "accessory_1"
+        elif not equipment["accessory_2"]:
+            return "accessory_2"
+        else:
+            # If both accessory slots are filled, replace the weaker one (fewest boosts in total)
+            if sum(item_vector(equipment["accessory_2"])) < sum(item_vector(equipment["accessory_1"])):
+                return "accessory_2"
+            return "accessory_1"
+    # If no known slot is detected, return None
+    return slot
+
+
+# --- CALCULATE TOTAL STATS WITH EQUIPMENT ---
+def calculate_total_stat(state, stat_name):
+    return state.player_stats.get(stat_name, 0) + state.equipment_bonus.bonus_for(stat_name)
+
+
+def calculate_total_stats(state):
+    # All totals at once: {"strength": ..., "defense": ..., "intelligence": ..., "endurance": ..., "magic": ...}
+    return state.equipment_bonus.totals(state.player_stats)
+
+
+
+# --- AUTO-EQUIP ---
+# Profiles that must keep every spell the player can cast now (gear like the Cursed Blade lowers intelligence)
+SPELL_PROFILES = {"caster"}
+
+
+def auto_equip(state, profile):
+    # Put on the best owned gear for `profile` (see loadout.py); returns [(slot, old item, new item)]
+    equipment, inventory = state.equipment, state.inventory
+    worn = [item for item in equipment.values() if item]
+    minimum = None
+    if profile in SPELL_PROFILES:
+        intelligence = calculate_total_stat(state, "intelligence")
+        castable = [spell["required_intelligence"] for spell in magic_spells.values() if spell["required_intelligence"] <= intelligence]
+        if castable:
+            minimum = ("intelligence", max(castable))
+    result = solve_loadout(profile, inventory + worn, equipment, state.player_stats, minimum)
+    if result is None:
+        result = solve_loadout(profile, inventory + worn, equipment)
+    changes = plan_changes(equipment, result[0])
+
+    # Take off first, so an item can move into the inventory and back out within one change
+    swaps = [(slot, equipment[slot], item) for slot, item in changes.items()]
+    for slot, old, _ in swaps:
+        if old:
+            inventory.append(old)
+            state.equipment_bonus.set_slot(equipment, slot, None)
+    for slot, _, new in swaps:
+        if new:
+            inventory.remove(new)
+            state.equipment_bonus.set_slot(equipment, slot, new)
+    return swaps
+
+
+
+# --- XP AND LEVELING SYSTEM ---
+def xp_required(level):
+    # Calculate the XP required for the next level (15 XP more for each level)
+    return 20 + (level - 1) * 15
+
+def check_level_up(state):
+    # Returns True if the player leveled up (the new stat points then wait for allocation)
+    player_stats = state.player_stats
+    level = player_stats.get("level", 1)
+    xp = player_stats.get("xp", 0)
+    max_xp = player_stats.get("max_xp", 20)
+    leveled_up = False
+    new_points = 0
+
+    # Check if the player has enough XP to level up, and level up if so
+    while xp >= max_xp:
+        xp -= max_xp
+        level += 1
+        player_stats["max_health"] += 10
+        player_stats["health"] = player_stats["max_health"]
+        new_points += 1
+        max_xp = xp_required(level)
+        leveled_up = True
+
+    # Update player stats
+    player_stats["xp"] = xp
+    player_stats["level"] = level
+    player_stats["max_xp"] = max_xp
+    player_stats["unassigned_stat_points"] = player_stats.get("unassigned_stat_points", 0) + new_points
+
+    if leveled_up:
+        state.awaiting_stat_allocation = True
+    return leveled_up
+
+
+# --- STAT ALLOCATION ---
+ALLOCATABLE_STATS = ("strength", "defense", "intelligence", "endurance", "magic")
+
+
+def assign_stat_point(state, stat):
+    # Spend one unassigned point on `stat`; returns the points left
+    player_stats = state.player_stats
+    if stat not in ALLOCATABLE_STATS:
+        raise ValueError(f"Unknown stat: {stat}")
+    if player_stats.get("unassigned_stat_points", 0) <= 0:
+        state.awaiting_stat_allocation = False
+        return 0
+
+    player_stats[stat] = player_stats.get(stat, 0) + 1
+
+    # Bonus effects based on stat
+    if stat == "endurance":
+        player_stats["max_stamina"] += 5
+        player_stats["stamina"] = player_stats["max_stamina"]
+    elif stat == "magic":
+        player_stats["max_mana"] += 5
+        player_stats["mana"] = player_stats["max_mana"]
+
+    # Update the unassigned stat points
+    player_stats["unassigned_stat_points"] -= 1
+    if player_stats["unassigned_stat_points"] <= 0:
+        state.awaiting_stat_allocation = False
+    return player_stats["unassigned_stat_points"]
+
+
+
+# --- META UPDATE PARSING ---
+def apply_meta_updates(state, text):
+    # Split story and META block in one pass (the same splitter the streaming mode feeds chunk by chunk)
+    splitter = MetaStreamSplitter()
+    splitter.feed(text)
+    splitter.close()
+    return apply_split_response(state, splitter)
+
+
+def apply_split_response(state, splitter):
+    player_stats, inventory, equipment = state.player_stats, state.inventory, state.equipment
+    if not splitter.meta_closed:
+        return splitter.story
+
+    # Remove the <META> tags and keep the story part
+    story_only = splitter.story.strip()
+
+    # Validated fields; fields that are broken are reported and skipped, the rest is still applied
+    updates, problems = splitter.updates()
+    if problems:
+        story_only += f"\n\n⚠️ Some meta updates were ignored: {'; '.join(problems)}."
+
+    try:
+        # Apply updates to player stats, inventory, and equipment
+        if "health" in updates:
+            damage = updates["health"]
+            # Only apply defense reduction on damage taken (the narrator gives the raw damage; combat damage
+            # is not in META, it was already applied by resolve_combat)
+            if damage < 0:
+                reduced_damage = -damage_taken(-damage, calculate_total_stat(state, "defense"))
+                player_stats["health"] = min(
+                    player_stats.get("max_health", 100),
+                    max(0, player_stats.get("health", 100) + reduced_damage)
+                )
+            else:
+                player_stats["health"] = min(
+                    player_stats.get("max_health", 100),
+                    player_stats.get("health", 100) + damage
+                )
+        if "gold" in updates:
+            player_stats["gold"] = max(0, player_stats.get("gold", 0) + updates["gold"])
+        if "xp" in updates:
+            player_stats["xp"] = player_stats.get("xp", 0) + updates["xp"]
+            check_level_up(state)
+        if "inventory_add" in updates:
+            for item in updates["inventory_add"]:
+                if item not in inventory:
+                    inventory.append(item)
+        if "inventory_remove" in updates:
+            for item in updates["inventory_remove"]:
+                if item in inventory:
+                    inventory.remove(item)
+        if "equip" in updates:
+            for slot_or_unknown, item in updates["equip"].items():
+                slot = slot_or_unknown if slot_or_unknown in equipment else detect_equipment_slot(state, item)
+                if slot and slot in equipment:
+                    state.equipment_bonus.set_slot(equipment, slot, item)
+                    if item in inventory:
+                        inventory.remove(item)
+                else:
+                    story_only += f"\n\n⚠️ Couldn't determine correct slot for '{item}'."
+        if "unequip" in updates:
+            for slot in updates["unequip"]:
+                if slot in equipment and equipment[slot]:
+                    inventory.append(equipment[slot])
+                    state.equipment_bonus.set_slot(equipment, slot, None)
+        if "enemies" in updates:
+            # New enemies get their stats from their level and the difficulty (see combat.py)
+            add_enemies(state.combat, updates["enemies"], state.difficulty, player_stats.get("level", 1))
+        if "enemies_remove" in updates:
+            remove_enemies(state.combat, updates["enemies_remove"])
+
+    # Handle other exceptions
+    except Exception as e:
+        story_only += f"\n\n❌ Error parsing meta update: {e}"
+
+    return story_only
+
+
+
+# --- TURN COSTS ---
+def apply_turn_costs(state, player_input):
+    # Parse the input once: actions, spells, items and targets
+    intent = parse_intent(player_input)
+
+    # Handle stamina loss (an action without the stamina for it is an exhausted one)
+    exhausted = state.player_stats["stamina"] < ACTION_STAMINA_COST
+    stamina_lost = handle_stamina_loss(state, stamina_action(intent))
+
+    # Handle spell casting
+    spell_result, cast = None, None
+    if intent["spells"]:
+        success, spell_result = cast_spell(state, intent["spells"][0])
+        cast = intent["spells"][0] if success else None
+
+    # Resolve the fight locally from the equipped totals; the narrator is only told the outcome
+    outcome = resolve_combat(state, intent, calculate_total_stats(state), cast, exhausted)
+    combat_text = describe_outcome(outcome) if outcome else ""
+    if outcome and outcome["xp"]:
+        check_level_up(state)
+
+    # Regenerate mana and stamina at end of turn
+    regenerate_stamina(state)
+    regenerate_mana(state)
+    return stamina_lost, spell_result, intent, combat_text
+
+
+
+# --- GAME STATE FIELDS ---
+def game_state_fields(state):
+    player_stats, equipment = state.player_stats, state.equipment
+    # get the current game state
+    health = f"{player_stats.get('health', 0)}/{player_stats.get('max_health', 0)}"
+    stamina = f"{player_stats.get('stamina', 0)}/{player_stats.get('max_stamina', 0)}"
+    mana = f"{player_stats.get('mana', 0)}/{player_stats.get('max_mana', 0)}"
+    totals = calculate_total_stats(state)
+    strength = totals['strength']
+    defense = totals['defense']
+    intelligence = totals['intelligence']
+    endurance = totals['endurance']
+    magic = totals['magic']
+    xp = f"{player_stats.get('xp', 0)}/{player_stats.get('max_xp', 0)}"
+    level = player_stats.get('level', 1)
+    gold = player_stats.get('gold', 0)
+
+
+    # Format inventory
+    def format_equipped(item):
+        if item and item in item_stat_boosts:
+            boosts = item_stat_boosts[item]
+            boost_str = ", ".join(f"{k}+{v}" for k, v in boosts.items())
+            return f"{item} ({boost_str})"
+        return item or "None"
+
+    # Format equipped items
+    equipped_items = "\n".join([
+        f"- 🗡️ Right Hand: {format_equipped(equipment['right_hand'])}",
+        f"- 🔦 Left Hand: {format_equipped(equipment['left_hand'])}",
+        f"- ⛑️ Helmet: {format_equipped(equipment['helmet'])}",
+        f"- 🛡️ Chestplate: {format_equipped(equipment['chestplate'])}",
+        f"- 👖 Leggings: {format_equipped(equipment['leggings'])}",
+        f"- 🥾 Boots: {format_equipped(equipment['boots'])}",
+        f"- 📿 Accessory 1: {format_equipped(equipment['accessory_1'])}",
+        f"- 📌 Accessory 2: {format_equipped(equipment['accessory_2'])}",
+    ])
+
+    # Get available spells
+    spells = print_available_spells(intelligence)
+
+
+    # One entry per stats panel field, so only the fields that changed are re-sent
+    return {
+        "inventory": f"**🧍 {state.player_name}'s Inventory:** {state.inventory}",
+        "vitals": f"**❤️ Health:** {health}  |  **🏃‍♂️ Stamina:** {stamina}  |  **🔮 Mana:** {mana}",
+        "attributes": f"**💪 Strength:** {strength}  |  **🛡 Defense:** {defense}  |  **🧠 Intelligence:** {intelligence}  |  **🦾 Endurance:** {endurance}  |  **✨ Magic:** {magic}",
+        "progress": f"**⭐ Level:** {level}  |  **🔹 XP:** {xp}  |  **💰 Gold:** {gold}",
+        "difficulty": f"🎯 Difficulty: {['Easy', 'Medium', 'Hard'][state.difficulty - 1]}",
+        "equipment": f"### 🧰 **Equipped Gear:**\n{equipped_items}",
+        "spells": f"### ✨ **Available Spells:**\n{spells}",
+    }
@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import os
+import google.generativeai as genai
+from aiohttp import web, WSMsgType
+from dotenv import load_dotenv
+from globals_variables import *
+from game_engine import GameEngine, UnknownSessionError, make_story_client
+from game_cluster import ShardedEngine
+from telemetry import Telemetry, prometheus_text
+
+
+# Local HTTP/WebSocket server: many players in one process, each with their own GameSession (see game_engine.py)
+#
+#   POST   /sessions                   {"player_name": "Ihno"}  -> {"session_id": ...}
+#   GET    /sessions/{id}                                      -> game view
+#   POST   /sessions/{id}/new_game     {"difficulty": "Medium"}
+#   POST   /sessions/{id}/turn         {"action": "I open the door"}
+#   POST   /sessions/{id}/allocate     {"stat": "magic"}
+#   POST   /sessions/{id}/auto_equip   {"profile": "melee"}  best owned gear for "melee", "caster" or "tank" (no model call)
+#   POST   /sessions/{id}/save, /sessions/{id}/load
+#   DELETE /sessions/{id}/save         deletes the save and ends the session
+#   DELETE /sessions/{id}              ends the session (it can be loaded again from its save)
+#   GET    /sessions/{id}/ws           WebSocket: send {"command": "turn", "action": ...} (or any command above),
+#                                      get {"type": "chunk", "text": ...} while the story streams, then {"type": "result", ...}
+#   GET    /metrics                    per-turn timings, sizes, tokens and retries in Prometheus text format
+
+ENGINE = web.AppKey("engine", GameEngine)
+routes = web.RouteTableDef()
+
+
+# --- COMMANDS ---
+COMMANDS = {
+    "new_game": lambda engine, session_id, data, on_chunk: engine.new_game(session_id, data.get("difficulty", "Medium")),
+    "turn": lambda engine, session_id, data, on_chunk: engine.play_turn(session_id, str(data.get("action", "")), on_chunk),
+    "allocate": lambda engine, session_id, data, on_chunk: engine.allocate_stat(session_id, str(data.get("stat", ""))),
+    "auto_equip": lambda engine, session_id, data, on_chunk: engine.auto_equip(session_id, str(data.get("profile", "melee"))),
+    "save": lambda engine, session_id, data, on_chunk: engine.save(session_id),
+    "load": lambda engine, session_id, data, on_chunk: engine.load(session_id),
+    "view": lambda engine, session_id, data, on_chunk: engine.view(session_id),
+}
+
+
+async def run_command(engine, session_id, command, data, on_chunk=None):
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown command: {command}")
+    return await COMMANDS[command](engine, session_id, data, on_chunk)
+
+
+async def read_json(request):
+    if not request.can_read_body:
+        return {}
+    data = await request.json()
+    if not isinstance(data, dict):
+        raise ValueError("The request body should be a JSON object.")
+    return data
+
+
+@web.middleware
+async def error_middleware(request, handler):
+    # Unknown sessions are 404, bad input (including invalid JSON) is 400
+    try:
+        return await handler(request)
+    except UnknownSessionError:
+        return web.json_response({"error": "Unknown session."}, status=404)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+
+# --- HTTP ---
+@routes.post("/sessions")
+async def create_session(request):
+    data = await read_json(request)
+    session_id = await request.app[ENGINE].create_session(str(data.get("player_name", "")))
+    return web.json_response({"session_id": session_id}, status=201)
+
+
+@routes.get("/sessions/{session_id}")
+async def view_session(request):
+    return web.json_response(await request.app[ENGINE].view(request.match_info["session_id"]))
+
+
+@routes.post("/sessions/{session_id}/{command}")
+async def session_command(request):
+    data = await read_json(request)
+    result = await run_command(request.app[ENGINE], request.match_info["session_id"], request.match_info["command"], data)
+    return web.json_response(result)
+
+
+@routes.delete("/sessions/{session_id}/save")
+async def delete_save(request):
+    await request.app[ENGINE].delete_save(request.match_info["session_id"])
+    return web.json_response({"messages": ["🗑️ Save file deleted."]})
+
+
+@routes.delete("/sessions/{session_id}")
+async def close_session(request):
+    await request.app[ENGINE].close_session(request.match_info["session_id"])
+    return web.json_response({})
+
+
+@routes.get("/metrics")
+async def metrics(request):
+    return web.Response(text=prometheus_text(await request.app[ENGINE].metrics()), content_type="text/plain", charset="utf-8")
+
+
+# --- WEBSOCKET ---
+@routes.get("/sessions/{session_id}/ws")
+async def session_socket(request):
+    engine = request.app[ENGINE]
+    session_id = request.match_info["session_id"]
+    # Unknown sessions are refused before the upgrade
+    await engine.view(session_id)
+
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    loop = asyncio.get_running_loop()
+
+    async for message in ws:
+        if message.type != WSMsgType.TEXT:
+            continue
+        # Story chunks come from a worker thread; they are queued on the loop and sent in order
+        chunks = asyncio.Queue()
+
+        def on_chunk(text):
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        async def forward_chunks():
+            while (text := await chunks.get()) is not None:
+                await ws.send_json({"type": "chunk", "text": text})
+
+        sender = asyncio.create_task(forward_chunks())
+        try:
+            data = json.loads(message.data)
+            if not isinstance(data, dict):
+                raise ValueError("Messages should be JSON objects.")
+            result = await run_command(engine, session_id, data.get("command"), data, on_chunk)
+            reply = {"type": "result", **result}
+        except UnknownSessionError:
+            reply = {"type": "error", "error": "Unknown session."}
+        except ValueError as e:
+            reply = {"type": "error", "error": str(e)}
+        finally:
+            # Queued after every chunk the finished command scheduled
+            chunks.put_nowait(None)
+            await sender
+        await ws.send_json(reply)
+    return ws
+
+
+# --- NARRATOR ---
+def gemini_narrator():
+    # Runs in every worker process (--processes > 1): each one configures its own client
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return make_story_client()
+
+
+# --- APP ---
+def create_app(engine):
+    app = web.Application(middlewares=[error_middleware])
+    app[ENGINE] = engine
+    app.add_routes(routes)
+
+    async def close_engine(app):
+        await app[ENGINE].close()
+    app.on_cleanup.append(close_engine)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dungeon AI game server")
+    parser.add_argument("--host", default=server_host)
+    parser.add_argument("--port", type=int, default=server_port)
+    parser.add_argument("--save-dir", default=server_save_dir)
+    parser.add_argument("--max-sessions", type=int, default=server_max_sessions)
+    parser.add_argument("--workers", type=int, default=server_turn_workers)
+    parser.add_argument("--processes", type=int, default=server_processes, help="worker processes, sessions are sharded over them")
+    parser.add_argument("--telemetry-log", default=telemetry_log_file, help='per-turn JSONL log ("" for metrics only)')
+    args = parser.parse_args()
+
+    # --- LOAD API KEY ---
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("❌ GOOGLE_API_KEY not found in .env file!")
+
+    if args.processes > 1:
+        # Sessions are sharded over worker processes, each with its own engine and model client
+        engine = ShardedEngine(
+            gemini_narrator, processes=args.processes, save_dir=args.save_dir,
+            max_sessions=args.max_sessions, max_workers=args.workers, telemetry_log=args.telemetry_log,
+        )
+        web.run_app(create_app(engine), host=args.host, port=args.port)
+        return
+
+    # One model client for every session: the model and its connection are shared
+    genai.configure(api_key=api_key)
+    story_client = make_story_client()
+    telemetry = Telemetry(args.telemetry_log, telemetry_max_bytes, telemetry_backup_count)
+    engine = GameEngine(
+        story_client, save_dir=args.save_dir, max_sessions=args.max_sessions, max_workers=args.workers, telemetry=telemetry,
+    )
+    try:
+        web.run_app(create_app(engine), host=args.host, port=args.port)
+    finally:
+        story_client.close()
+
+
+if __name__ == "__main__":
+    main()
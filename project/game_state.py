@@ -0,0 +1,189 @@
+from equipment_stats import EquipmentStats
+from combat import new_combat, copy_combat, load_combat
+
+
+# --- STAT LAYOUT ---
+# Every stat a player has, in the order they are shown in prompts and saves
+STAT_FIELDS = (
+    "strength", "defense", "intelligence", "endurance", "magic",
+    "xp", "level", "max_xp", "gold",
+    "max_health", "max_stamina", "max_mana",
+    "unassigned_stat_points", "health", "stamina", "mana",
+)
+_STAT_FIELD_SET = frozenset(STAT_FIELDS)
+
+EQUIPMENT_SLOTS = ("left_hand", "right_hand", "helmet", "chestplate", "leggings", "boots", "accessory_1", "accessory_2")
+
+
+def empty_equipment():
+    return {slot: None for slot in EQUIPMENT_SLOTS}
+
+
+# --- PLAYER STATS ---
+class PlayerStats:
+    # Fixed-layout stats: one slot per stat instead of a dict per player.
+    # Keeps the dict-style access the game uses (stats["gold"], stats.get("xp", 0)) and prints like a dict in prompts.
+    __slots__ = STAT_FIELDS
+
+    def __init__(self, values=None):
+        if values:
+            self.update(values)
+
+    def __getitem__(self, key):
+        if key not in _STAT_FIELD_SET or not hasattr(self, key):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in _STAT_FIELD_SET:
+            raise KeyError(f"Unknown stat: {key}")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in _STAT_FIELD_SET and hasattr(self, key)
+
+    def __iter__(self):
+        return (name for name in STAT_FIELDS if hasattr(self, name))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, (PlayerStats, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def get(self, key, default=None):
+        if key not in _STAT_FIELD_SET:
+            return default
+        return getattr(self, key, default)
+
+    def items(self):
+        return ((name, getattr(self, name)) for name in self)
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def copy(self):
+        clone = PlayerStats.__new__(PlayerStats)
+        for name in self:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+
+# --- NEW GAME PRESETS ---
+DIFFICULTY_LEVELS = {"Easy": 1, "Medium": 2, "Hard": 3}
+
+BASE_STATS = {
+    "strength": 10, "defense": 0, "intelligence": 1, "endurance": 1, "magic": 1,
+    "xp": 0, "level": 1, "max_xp": 20, "gold": 5,
+    "max_health": 100, "max_stamina": 80, "max_mana": 30,
+    "unassigned_stat_points": 0
+}
+
+# Difficulty -> (stats on top of BASE_STATS, starting inventory)
+DIFFICULTY_PRESETS = {
+    "Easy": ({"health": 200, "max_health": 200, "strength": 15, "defense": 5, "mana": 50, "max_mana": 50, "stamina": 100, "max_stamina": 100}, ["Torch", "Wooden Sword"]),
+    "Medium": ({"health": 100, "max_health": 100, "strength": 10, "defense": 2, "mana": 30, "max_mana": 30, "stamina": 80, "max_stamina": 80}, ["Torch", "Wooden Stick"]),
+    "Hard": ({"health": 50, "max_health": 50, "strength": 5, "defense": 0, "mana": 10, "max_mana": 10, "stamina": 50, "max_stamina": 50}, ["Torch"]),
+}
+
+
+# --- GAME STATE ---
+class GameState:
+    # Everything one player's game reads or changes during a turn, so several games can live in one process.
+    # snapshot() gives a copy that background work (saves, speculative prompts) can use while the game goes on.
+    __slots__ = (
+        "player_name", "difficulty", "context", "game_memory", "memory_start", "player_stats",
+        "inventory", "equipment", "awaiting_stat_allocation", "equipment_bonus", "combat",
+    )
+
+    def __init__(self, player_name=None):
+        self.player_name = player_name
+        self.difficulty = 1
+        self.context = ""
+        self.game_memory = []
+        # How many entries have been dropped from the front of game_memory so far (see story_memory.trim),
+        # so game_memory[i] is entry number memory_start + i of the whole game
+        self.memory_start = 0
+        self.player_stats = PlayerStats()
+        self.inventory = []
+        self.equipment = empty_equipment()
+        self.awaiting_stat_allocation = False
+        # Precomputed sum of the boosts of everything equipped; updated on equip/unequip and on load
+        self.equipment_bonus = EquipmentStats(self.equipment)
+        # Enemies of the current encounter and timed spell effects (see combat.py)
+        self.combat = new_combat()
+
+    def new_game(self, difficulty_choice):
+        # Starting stats, inventory and story for "Easy", "Medium" or "Hard"
+        preset_stats, starting_inventory = DIFFICULTY_PRESETS[difficulty_choice]
+        stats = dict(BASE_STATS)
+        stats.update(preset_stats)
+        stats["health"] = stats.get("health", stats["max_health"])
+        stats["stamina"] = stats["max_stamina"]
+        stats["mana"] = stats["max_mana"]
+
+        self.difficulty = DIFFICULTY_LEVELS[difficulty_choice]
+        self.player_stats = PlayerStats(stats)
+        self.inventory = list(starting_inventory)
+        self.equipment = empty_equipment()
+        self.equipment_bonus.rebuild(self.equipment)
+        self.awaiting_stat_allocation = False
+        self.combat = new_combat()
+        self.context = f"{self.player_name} awakens in a dark forest. A mysterious figure approaches."
+        self.game_memory = [self.context]
+        self.memory_start = 0
+
+    def snapshot(self):
+        # Strings are immutable and shared; only the small containers are copied
+        clone = GameState.__new__(GameState)
+        clone.player_name = self.player_name
+        clone.difficulty = self.difficulty
+        clone.context = self.context
+        clone.game_memory = list(self.game_memory)
+        clone.memory_start = self.memory_start
+        clone.player_stats = self.player_stats.copy()
+        clone.inventory = list(self.inventory)
+        clone.equipment = dict(self.equipment)
+        clone.awaiting_stat_allocation = self.awaiting_stat_allocation
+        clone.equipment_bonus = self.equipment_bonus.copy()
+        clone.combat = copy_combat(self.combat)
+        return clone
+
+    # --- SAVE FORMAT ---
+    def to_save_dict(self):
+        # Plain JSON-ready copies (the savegame.json layout)
+        return {
+            "context": self.context,
+            "game_memory": list(self.game_memory),
+            "memory_start": self.memory_start,
+            "player_stats": self.player_stats.to_dict(),
+            "inventory": list(self.inventory),
+            "difficulty": self.difficulty,
+            "equipment": dict(self.equipment),
+            "player_name": self.player_name,
+            "combat": copy_combat(self.combat),
+        }
+
+    def load_save_dict(self, data):
+        # Older saves have no player_name: keep the current one
+        self.player_name = data.get("player_name") or self.player_name
+        self.context = data["context"]
+        self.game_memory = data["game_memory"]
+        self.memory_start = data.get("memory_start", 0)
+        # Stats this version doesn't have (an older or hand-edited save) are left out
+        self.player_stats = PlayerStats({key: value for key, value in data["player_stats"].items() if key in _STAT_FIELD_SET})
+        self.inventory = data["inventory"]
+        self.difficulty = data["difficulty"]
+        self.equipment = empty_equipment()
+        self.equipment.update(data["equipment"])
+        self.equipment_bonus.rebuild(self.equipment)
+        self.combat = load_combat(data.get("combat"))
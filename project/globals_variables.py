@@ -1,21 +1,53 @@
 # --- GLOBALS ---
 model_name = "gemini-2.0-flash"
-player_name = None
-context = ""
-game_memory = []
-player_stats = {}
-inventory = []
-difficulty = 1
 save_file = "savegame.json"
-awaiting_stat_allocation = False
-
-equipment = {
-    "left_hand": None,
-    "right_hand": None,
-    "helmet": None,
-    "chestplate": None,
-    "leggings": None,
-    "boots": None,
-    "accessory_1": None,
-    "accessory_2": None
-}
\ No newline at end of file
+save_snapshot_every = 20
+background_autosave = True
+stream_narration = True
+use_turn_queue = True
+
+# --- STORY MEMORY ---
+memory_cap = 40
+prompt_token_budget = 1000
+retrieval_top_k = 3
+retrieval_token_cap = 200
+
+# --- SPECULATIVE PREFETCH ---
+speculative_prefetch = False
+prefetch_max_candidates = 3
+prefetch_budget_ratio = 2.0
+
+# --- MODEL CLIENT ---
+model_deadline_seconds = 30
+model_max_retries = 3
+model_hedge_requests = False
+
+# --- REQUEST SCHEDULER ---
+# The API quota (set these to your project's limits) and how many requests may be in flight at once
+model_requests_per_minute = 2000
+model_tokens_per_minute = 4_000_000
+model_max_concurrent = 16
+model_expected_output_tokens = 400
+
+# --- PROMPT CACHING ---
+use_context_cache = True
+cache_model_name = "models/gemini-2.0-flash-001"
+context_cache_ttl_minutes = 60
+
+# --- GAME SERVER ---
+server_host = "127.0.0.1"
+server_port = 8080
+server_save_dir = "saves"
+server_max_sessions = 1000
+server_turn_workers = 64
+server_processes = 1
+
+# --- TELEMETRY ---
+telemetry_log_file = "telemetry/turns.jsonl"
+telemetry_max_bytes = 5_000_000
+telemetry_backup_count = 5
+
+# --- MEMORY PROFILING ---
+# Sample memory every N turns with tracemalloc (slow, 0 = off); reports go to memory_report_dir
+memory_profile_every = 0
+memory_report_dir = "memory_reports"
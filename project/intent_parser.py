@@ -0,0 +1,105 @@
+import re
+from item_stats import item_stat_boosts
+from magic_spells import magic_spells
+
+
+# --- VOCABULARY ---
+# Actions that cost stamina, in the order they win if several are typed
+STAMINA_ACTIONS = ("attack", "run", "defend", "dodge")
+# Words that introduce a target: "cast Firebolt at the goblin", "attack on the orc"
+TARGET_MARKERS = {"at", "on", "against", "toward", "towards"}
+# Actions whose object is a target too: "attack the goblin"
+TARGETED_ACTIONS = {"attack"}
+ARTICLES = {"the", "a", "an", "that", "this", "my"}
+TARGET_STOPWORDS = {"and", "then", "with", "using", "while", "but", "before", "after", "to", "of"}
+
+
+def tokenize_input(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def build_phrase_trie():
+    # Word-level trie over every spell and catalog item name: {"frost": {"grasp": {None: ("spell", "Frost Grasp")}}}
+    trie = {}
+    for kind, names in (("item", item_stat_boosts), ("spell", magic_spells)):
+        for name in names:
+            node = trie
+            for word in tokenize_input(name):
+                node = node.setdefault(word, {})
+            node[None] = (kind, name)
+    return trie
+
+
+# Built once from the catalogs
+PHRASE_TRIE = build_phrase_trie()
+ACTION_WORDS = set(STAMINA_ACTIONS)
+
+
+# --- PARSER ---
+def _longest_phrase(words, start):
+    node = PHRASE_TRIE
+    match = (None, 0)
+    for length, word in enumerate(words[start:], 1):
+        node = node.get(word)
+        if node is None:
+            break
+        if None in node:
+            match = (node[None], length)
+    return match
+
+
+def _target_at(words, start):
+    # Up to three words after a target marker, without the article
+    i = start
+    while i < len(words) and words[i] in ARTICLES:
+        i += 1
+    target = []
+    while i < len(words) and len(target) < 3 and words[i] not in TARGET_STOPWORDS and words[i] not in TARGET_MARKERS:
+        target.append(words[i])
+        i += 1
+    return " ".join(target)
+
+
+def parse_intent(player_input):
+    # One pass over the words of the input, whole words only ("running" is not "run", "Blinking" is not "Blink")
+    words = tokenize_input(player_input)
+    intent = {"actions": [], "spells": [], "items": [], "targets": []}
+
+    i = 0
+    while i < len(words):
+        found, length = _longest_phrase(words, i)
+        if found:
+            kind, name = found
+            bucket = intent["spells"] if kind == "spell" else intent["items"]
+            if name not in bucket:
+                bucket.append(name)
+            i += length
+            continue
+
+        word = words[i]
+        if word in ACTION_WORDS and word not in intent["actions"]:
+            intent["actions"].append(word)
+            if word in TARGETED_ACTIONS:
+                target = _target_at(words, i + 1)
+                if target and target not in intent["targets"]:
+                    intent["targets"].append(target)
+        elif word in TARGET_MARKERS:
+            target = _target_at(words, i + 1)
+            if target and target not in intent["targets"]:
+                intent["targets"].append(target)
+        i += 1
+    return intent
+
+
+def stamina_action(intent):
+    # The action that costs stamina this turn ("" if none), same priority as before
+    for action in STAMINA_ACTIONS:
+        if action in intent["actions"]:
+            return action
+    return ""
+
+
+def describe_intent(intent):
+    # Short line for the prompt, e.g. "actions: attack; spells: Firebolt; targets: goblin"
+    parts = [f"{key}: {', '.join(values)}" for key, values in intent.items() if values]
+    return "; ".join(parts)
@@ -0,0 +1,179 @@
+from collections import Counter
+from item_stats import item_slots
+from equipment_stats import STAT_NAMES, STAT_INDEX, ZERO_VECTOR, item_vector
+
+
+# Best gear for a play style: which owned items (inventory + what is worn) to put in the eight equipment slots
+# so the weighted sum of the boosts is highest. Slots come from the catalog (items the model invents have none),
+# both accessory slots take from the same list (two copies of a ring can fill both), and items with negative boosts
+# only go on when they are worth it. A worn item the catalog doesn't know is kept unless something better goes there.
+# An optional minimum (e.g. "keep enough intelligence for my spells") makes it a real search: slot group by slot group,
+# keeping the best loadout for each reachable total of that stat, over candidate lists sorted once per profile.
+
+# Stat weights per play style
+WEIGHT_PROFILES = {
+    "melee": {"strength": 1.0, "endurance": 0.5, "defense": 0.5, "intelligence": 0.0, "magic": 0.0},
+    "caster": {"intelligence": 1.0, "magic": 1.0, "endurance": 0.25, "strength": 0.0, "defense": 0.25},
+    "tank": {"defense": 1.0, "endurance": 0.75, "strength": 0.25, "intelligence": 0.0, "magic": 0.0},
+}
+
+# Slot group in the catalog -> equipment slots it fills
+SLOT_GROUPS = {
+    "right_hand": ("right_hand",), "left_hand": ("left_hand",), "helmet": ("helmet",), "chestplate": ("chestplate",),
+    "leggings": ("leggings",), "boots": ("boots",), "accessory": ("accessory_1", "accessory_2"),
+}
+
+# Tie-break for the gear already worn, so equal items are not swapped back and forth
+KEEP_BONUS = 1e-6
+
+
+# --- CANDIDATE LISTS ---
+def _score(item, weights):
+    vector = item_vector(item)
+    return sum(weights.get(name, 0.0) * vector[i] for i, name in enumerate(STAT_NAMES))
+
+
+def build_candidates(weights):
+    # Slot group -> every catalog item of that group as (score, item, stat vector), best first
+    candidates = {group: [] for group in SLOT_GROUPS}
+    for item, group in item_slots.items():
+        candidates[group].append((_score(item, weights), item, item_vector(item)))
+    for items in candidates.values():
+        items.sort(key=lambda entry: (-entry[0], entry[1]))
+    return candidates
+
+
+# Built once per profile on first use
+_candidates = {}
+
+
+def profile_candidates(profile):
+    if profile not in WEIGHT_PROFILES:
+        raise ValueError(f"Unknown profile: {profile}. Choose from {', '.join(WEIGHT_PROFILES)}.")
+    if profile not in _candidates:
+        _candidates[profile] = build_candidates(WEIGHT_PROFILES[profile])
+    return _candidates[profile]
+
+
+# --- SOLVER ---
+def solve_loadout(profile, owned, equipment=None, base_stats=None, minimum=None):
+    # owned: every item the player has (inventory and worn), one entry per copy; equipment: {slot: item} worn now.
+    # minimum: (stat, value) the stat's total (base_stats + gear) must reach, if possible.
+    # Returns ({slot: item or None}, score); None if no loadout reaches the minimum.
+    counts = Counter(owned)
+    equipment = equipment or {}
+    worn = set(equipment.values())
+    # Per slot group: its slots and its options as (score, item, vector), best first, one entry per copy that fits
+    groups = []
+    for group, group_slots in SLOT_GROUPS.items():
+        options = []
+        for score, item, vector in profile_candidates(profile)[group]:
+            copies = min(counts[item], len(group_slots))
+            if copies:
+                options += [(score + KEEP_BONUS if item in worn else score, item, vector)] * copies
+        # A worn item without a catalog entry can stay, and gives way to anything scoring above 0
+        for slot in group_slots:
+            item = equipment.get(slot)
+            if item and item not in item_slots:
+                options.append((KEEP_BONUS, item, ZERO_VECTOR))
+        options.sort(key=lambda entry: -entry[0])
+        groups.append((group_slots, options))
+
+    best = _best_unconstrained(groups)
+    if minimum is None:
+        return best
+    stat, value = minimum
+    index = STAT_INDEX[stat]
+    needed = value - (base_stats or {}).get(stat, 0)
+    # Usually the best gear reaches the minimum anyway
+    if sum(item_vector(item)[index] for item in best[0].values() if item) >= needed:
+        return best
+    return _best_constrained(groups, index, needed)
+
+
+def _best_unconstrained(groups):
+    # Scores add up per slot: the best options of each group (the accessory slots take the best two), nothing below 0
+    loadout, total = {}, 0.0
+    for group_slots, options in groups:
+        best = [entry for entry in options[:len(group_slots)] if entry[0] > 0]
+        for i, slot in enumerate(group_slots):
+            loadout[slot] = best[i][1] if i < len(best) else None
+        total += sum(entry[0] for entry in best)
+    return loadout, round(total, 4)
+
+
+def _group_choices(group_slots, options, index):
+    # What one slot group can hold, as (items, score, amount of the constrained stat): a single item or nothing,
+    # or for the accessory slots any two options. An option that others beat on score and on the stat is left out
+    # (for the accessory slots: beaten by two others), it can never be needed.
+    kept = []
+    # The largest amounts kept so far, one per slot
+    top = []
+    for score, item, vector in options:
+        # Options come best first, so only earlier ones can beat this one (and the first ones to do so are kept)
+        amount = vector[index]
+        if len(top) < len(group_slots) or amount > top[-1]:
+            kept.append((score, item, amount))
+            top = sorted(top + [amount], reverse=True)[:len(group_slots)]
+    choices = [((None,) * len(group_slots), 0.0, 0)]
+    if len(group_slots) == 1:
+        choices += [((item,), score, amount) for score, item, amount in kept]
+    else:
+        choices += [((item, None), score, amount) for score, item, amount in kept]
+        choices += [((first, second), first_score + second_score, first_amount + second_amount)
+                    for i, (first_score, first, first_amount) in enumerate(kept) for second_score, second, second_amount in kept[i + 1:]]
+    return choices
+
+
+def _best_constrained(groups, index, needed):
+    # Exact search over the total of the constrained stat: after each slot group, keep only the best loadout
+    # for every total. Totals that can no longer reach `needed` are dropped and totals that are sure to stay
+    # above it whatever comes next are merged, so only a handful are left at any time.
+    # Per group, only the best choice for each amount of the stat can be part of the answer
+    group_choices = []
+    for group_slots, options in groups:
+        best_choices = {}
+        for items, score, amount in _group_choices(group_slots, options, index):
+            if amount not in best_choices or score > best_choices[amount][0]:
+                best_choices[amount] = (score, items)
+        group_choices.append(best_choices)
+    # Lowest and highest amount still possible from group i on
+    lowest_rest = [0] * (len(groups) + 1)
+    highest_rest = [0] * (len(groups) + 1)
+    for i in range(len(groups) - 1, -1, -1):
+        lowest_rest[i] = lowest_rest[i + 1] + min(group_choices[i])
+        highest_rest[i] = highest_rest[i + 1] + max(group_choices[i])
+
+    # total of the stat -> (score, items so far)
+    frontier = {0: (0.0, ())}
+    for i, best_choices in enumerate(group_choices):
+        floor = needed - highest_rest[i + 1]
+        ceiling = needed - lowest_rest[i + 1]
+        next_frontier = {}
+        for total, (score, chosen) in frontier.items():
+            for amount, (choice_score, items) in best_choices.items():
+                key = total + amount
+                if key < floor:
+                    continue
+                if key > ceiling:
+                    key = ceiling
+                entry = next_frontier.get(key)
+                if entry is None or score + choice_score > entry[0]:
+                    next_frontier[key] = (score + choice_score, chosen + items)
+        frontier = next_frontier
+
+    if not frontier:
+        return None
+    score, chosen = max(frontier.values(), key=lambda entry: entry[0])
+    slots = [slot for group_slots, _ in groups for slot in group_slots]
+    return dict(zip(slots, chosen)), round(score, 4)
+
+
+# --- APPLY ---
+def plan_changes(equipment, loadout):
+    # {slot: item} for the slots that change; an accessory already worn stays in the slot it is in
+    target = dict(loadout)
+    first, second = target["accessory_1"], target["accessory_2"]
+    if (first and first == equipment["accessory_2"]) or (second and second == equipment["accessory_1"]):
+        target["accessory_1"], target["accessory_2"] = second, first
+    return {slot: item for slot, item in target.items() if equipment.get(slot) != item}
@@ -1,52 +1,65 @@
+# Spells the player can learn. "combat" is what the spell does in the local combat rules (see combat.py):
+# damage ("targets": "all" hits every enemy), heal, drain (heals you for the damage the spell really dealt), slow_turns, shield_defense for shield_turns, hidden_turns
+# (enemies can't hit you), stamina, extra_actions (one more attack this turn).
 magic_spells = {
     "Firebolt": {
         "mana_cost": 5,
         "required_intelligence": 1,
-        "effect": "Deals 12 damage to a single target."
+        "effect": "Deals 12 damage to a single target.",
+        "combat": {"damage": 12}
     },
     "Frost Grasp": {
         "mana_cost": 6,
         "required_intelligence": 2,
-        "effect": "Slows an enemy for 2 turns and deals 8 damage."
+        "effect": "Slows an enemy for 2 turns and deals 8 damage.",
+        "combat": {"damage": 8, "slow_turns": 2}
     },
     "Arcane Shield": {
         "mana_cost": 10,
         "required_intelligence": 6,
-        "effect": "Increases defense by +5 for 3 turns."
+        "effect": "Increases defense by +5 for 3 turns.",
+        "combat": {"shield_defense": 5, "shield_turns": 3}
     },
     "Healing Light": {
         "mana_cost": 8,
         "required_intelligence": 4,
-        "effect": "Restores 15 HP to yourself."
+        "effect": "Restores 15 HP to yourself.",
+        "combat": {"heal": 15}
     },
     "Chain Lightning": {
         "mana_cost": 14,
         "required_intelligence": 7,
-        "effect": "Hits for 10 damage."
+        "effect": "Hits for 10 damage.",
+        "combat": {"damage": 10, "targets": "all"}
     },
     "Shadow Cloak": {
         "mana_cost": 7,
         "required_intelligence": 3,
-        "effect": "Grants invisibility for 1 turn and +10 stamina."
+        "effect": "Grants invisibility for 1 turn and +10 stamina.",
+        "combat": {"hidden_turns": 1, "stamina": 10}
     },
     "Meteor Crash": {
         "mana_cost": 20,
         "required_intelligence": 12,
-        "effect": "Summons a small meteor that deals 25 damage."
+        "effect": "Summons a small meteor that deals 25 damage.",
+        "combat": {"damage": 25}
     },
     "Drain Life": {
         "mana_cost": 9,
         "required_intelligence": 5,
-        "effect": "Deals 10 damage to an enemy and heals you for the same amount."
+        "effect": "Deals 10 damage to an enemy and heals you for the same amount.",
+        "combat": {"damage": 10, "drain": True}
     },
     "Blink": {
         "mana_cost": 4,
         "required_intelligence": 8,
-        "effect": "Teleports you a short distance to evade attacks or cross gaps."
+        "effect": "Teleports you a short distance to evade attacks or cross gaps.",
+        "combat": {"hidden_turns": 1}
     },
     "Time Dilation": {
         "mana_cost": 12,
         "required_intelligence": 20,
-        "effect": "Slows all enemies for 1 turn and gives you +1 extra action that round."
+        "effect": "Slows all enemies for 1 turn and gives you +1 extra action that round.",
+        "combat": {"slow_turns": 1, "targets": "all", "extra_actions": 1}
     }
 }
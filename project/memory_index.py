@@ -0,0 +1,133 @@
+import heapq
+import math
+import re
+from story_memory import estimate_tokens, truncate_to_tokens
+
+
+# Words that say nothing about which earlier event is relevant
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "of", "to", "in", "on", "at", "by", "for", "with", "from",
+    "into", "onto", "up", "down", "out", "over", "under", "is", "are", "was", "were", "be", "been", "it", "its",
+    "this", "that", "these", "those", "you", "your", "yours", "i", "me", "my", "we", "he", "she", "they", "them",
+    "his", "her", "their", "do", "does", "did", "what", "which", "who", "as", "so", "not", "no", "yes", "can",
+    "will", "would", "should", "there", "here", "have", "has", "had", "all", "any", "some", "one", "now",
+}
+
+
+def tokenize(text):
+    return [w for w in re.findall(r"[a-z0-9']+", text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+# --- BM25 INDEX ---
+class MemoryIndex:
+    # In-process BM25 index over every narration and player input of the session.
+    # Append-only: add() only touches the postings of the new passage's own words, and a search only
+    # walks the postings of the query's rarest words, so a lookup costs about the same at turn 10 and turn 10000:
+    # - `ignore_words` (the player's name, which starts every "Name: input" passage) are never indexed
+    # - once there are `min_docs` passages, words in more than `max_df_ratio` of them are skipped (a name in
+    #   3 of 8 passages still counts); they barely score anyway
+    # - at most `max_query_terms` words, and no more than `max_postings` postings in all, are walked
+
+    def __init__(self, k1=1.2, b=0.75, max_df_ratio=0.05, min_docs=50, max_query_terms=6, max_postings=256, ignore_words=()):
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+        self.min_docs = min_docs
+        self.max_query_terms = max_query_terms
+        self.max_postings = max_postings
+        self.ignore_words = frozenset(ignore_words)
+        self.passages = []
+        self.lengths = []
+        self.total_length = 0
+        # term -> ([doc ids], [term frequencies]), doc ids are increasing
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.passages)
+
+    def add(self, text):
+        doc_id = len(self.passages)
+        terms = self.terms(text)
+        self.passages.append(text)
+        self.lengths.append(len(terms))
+        self.total_length += len(terms)
+
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            doc_ids, frequencies = self.postings.setdefault(term, ([], []))
+            doc_ids.append(doc_id)
+            frequencies.append(count)
+        return doc_id
+
+    def terms(self, text):
+        return [w for w in tokenize(text) if w not in self.ignore_words]
+
+    def rebuild(self, passages, ignore_words=None):
+        # ignore_words: e.g. the words of the player's name (None keeps the current ones)
+        if ignore_words is None:
+            ignore_words = self.ignore_words
+        self.__init__(self.k1, self.b, self.max_df_ratio, self.min_docs, self.max_query_terms, self.max_postings, ignore_words)
+        for passage in passages:
+            self.add(passage)
+
+    def search(self, query, top_k=3, exclude=()):
+        # Returns [(score, passage)] for the best matching passages, best first
+        n = len(self.passages)
+        if n == 0:
+            return []
+        average_length = self.total_length / n or 1
+        scores = {}
+
+        candidates = []
+        for term in set(self.terms(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            df = len(posting[0])
+            if n >= self.min_docs and df > self.max_df_ratio * n:
+                continue
+            candidates.append((df, term))
+        candidates.sort()
+
+        # BM25 length normalization k1 * (1 - b + b * length / average_length), split into its two parts
+        lengths = self.lengths
+        norm_base = self.k1 * (1 - self.b)
+        norm_scale = self.k1 * self.b / average_length
+        budget = self.max_postings
+        for df, term in candidates[:self.max_query_terms]:
+            if df > budget:
+                break
+            budget -= df
+            doc_ids, frequencies = self.postings[term]
+            weight = math.log(1 + (n - df + 0.5) / (df + 0.5)) * (self.k1 + 1)
+            for doc_id, tf in zip(doc_ids, frequencies):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * tf / (tf + norm_base + norm_scale * lengths[doc_id])
+
+        best = heapq.nlargest(top_k + len(exclude), scores.items(), key=lambda item: item[1])
+        results = []
+        for doc_id, score in best:
+            passage = self.passages[doc_id]
+            if passage in exclude:
+                continue
+            results.append((score, passage))
+            if len(results) == top_k:
+                break
+        return results
+
+    def recall(self, query, top_k=3, max_tokens=200, exclude=()):
+        # Prompt section with the most relevant older passages, never longer than max_tokens
+        lines = []
+        used = estimate_tokens("Related earlier events:")
+        per_passage = max(10, max_tokens // max(1, top_k))
+        for _, passage in self.search(query, top_k, exclude):
+            line = "- " + truncate_to_tokens(" ".join(passage.split()), per_passage)
+            cost = estimate_tokens(line)
+            if used + cost > max_tokens:
+                break
+            lines.append(line)
+            used += cost
+        if not lines:
+            return ""
+        return "Related earlier events:\n" + "\n".join(lines)
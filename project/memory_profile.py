@@ -0,0 +1,167 @@
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from types import BuiltinFunctionType, FunctionType, ModuleType
+
+
+# Opt-in memory-growth profiling for long sessions (memory_profile_every in globals_variables.py, or
+# simulate.py --memory-profile N): every N turns a tracemalloc snapshot plus the size of each state structure
+# (story text, game_memory, summaries, recall index, the serialized save, ...). The report gives bytes per turn
+# for each structure and the call sites that allocated the most since the first sample, in a JSON file
+# with the same layout every run so runs can be compared.
+# tracemalloc makes every allocation slower (allocation-heavy code such as the recall search by 10x or more),
+# so this is for measuring, not for playing.
+
+# --- SIZES ---
+def deep_size(obj):
+    # Bytes of `obj` and everything it references (each object once); classes, modules and functions are not counted
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, ModuleType, FunctionType, BuiltinFunctionType)):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return size
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def session_sources(session):
+    # Structures of one GameSession, name -> function returning their size in bytes.
+    # Narrations are shared between game_memory and the recall index, so structures can count the same text.
+    state = session.state
+
+    def save_data():
+        data = state.to_save_dict()
+        data["story_memory"] = session.story_memory.to_dict()
+        data["memory_passages"] = list(session.memory_index.passages)
+        return data
+
+    return {
+        "context": lambda: sys.getsizeof(state.context),
+        "game_memory": lambda: deep_size(state.game_memory),
+        "story_memory": lambda: deep_size(session.story_memory.to_dict()),
+        "memory_index": lambda: deep_size(session.memory_index),
+        # What a full snapshot writes, and what is on disk now (snapshot + journal)
+        "save_serialized": lambda: len(json.dumps(save_data()).encode("utf-8")),
+        "save_files": lambda: file_size(session.save_journal.save_file) + file_size(session.save_journal.journal_file),
+    }
+
+
+# --- PROFILER ---
+class MemoryProfiler:
+    # Call turn_played() after every turn; every `every` turns it samples the sources and tracemalloc
+
+    def __init__(self, every=50, report_dir="memory_reports", top=15, frames=1):
+        self.every = every
+        self.report_dir = report_dir
+        self.top = top
+        self.sources = {}
+        self.samples = []
+        self.turns = 0
+        self._first_snapshot = None
+        self._last_snapshot = None
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(frames)
+        self.created = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def add_sources(self, sources):
+        # name -> function returning bytes; a later source with the same name replaces the earlier one
+        self.sources.update(sources)
+
+    def turn_played(self):
+        self.turns += 1
+        if self.turns % self.every == 0:
+            self.sample()
+
+    def _snapshot(self):
+        # Leave out the profiler's own allocations
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def sample(self):
+        structures = {name: measure() for name, measure in self.sources.items()}
+        snapshot = self._snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        top_growth = []
+        if self._last_snapshot is not None:
+            top_growth = self._growth_sites(snapshot, self._last_snapshot)
+        self.samples.append({
+            "turn": self.turns,
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "structures": structures,
+            "top_growth_since_last": top_growth,
+        })
+        if self._first_snapshot is None:
+            self._first_snapshot = snapshot
+        self._last_snapshot = snapshot
+
+    def _growth_sites(self, snapshot, earlier):
+        # Call sites (file:line) that allocated the most between two snapshots
+        return [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size_diff, "blocks": stat.count_diff}
+            for stat in snapshot.compare_to(earlier, "lineno")[:self.top]
+            if stat.size_diff > 0
+        ]
+
+    # --- REPORT ---
+    def report(self):
+        bytes_per_turn = {}
+        if len(self.samples) >= 2:
+            first, last = self.samples[0], self.samples[-1]
+            turns = last["turn"] - first["turn"]
+            bytes_per_turn["traced"] = round((last["traced_bytes"] - first["traced_bytes"]) / turns, 1)
+            for name, size in last["structures"].items():
+                if name in first["structures"]:
+                    bytes_per_turn[name] = round((size - first["structures"][name]) / turns, 1)
+
+        top_growth = []
+        if self._first_snapshot is not None and self._last_snapshot is not self._first_snapshot:
+            top_growth = self._growth_sites(self._last_snapshot, self._first_snapshot)
+        return {
+            "meta": {
+                "created": self.created,
+                "python": platform.python_version(),
+                "every": self.every,
+                "turns": self.turns,
+            },
+            "bytes_per_turn": bytes_per_turn,
+            "top_growth_sites": top_growth,
+            "samples": self.samples,
+        }
+
+    def write_report(self, path=None):
+        path = path or os.path.join(self.report_dir, f"memory-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def format_summary(self):
+        report = self.report()
+        lines = [f"{'structure':<18}{'bytes/turn':>14}{'now (bytes)':>16}"]
+        latest = self.samples[-1]["structures"] if self.samples else {}
+        for name, per_turn in report["bytes_per_turn"].items():
+            now = self.samples[-1]["traced_bytes"] if name == "traced" else latest.get(name, 0)
+            lines.append(f"{name:<18}{per_turn:>14.1f}{now:>16}")
+        for site in report["top_growth_sites"][:5]:
+            lines.append(f"  +{site['bytes']} B  {site['site']}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
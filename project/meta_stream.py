@@ -0,0 +1,211 @@
+import json
+import re
+
+META_OPEN = "<META>"
+META_CLOSE = "</META>"
+
+
+# --- PARTIAL TAG HELPER ---
+def _partial_tag_length(text, tag):
+    # Length of the longest end of `text` that could be the start of `tag` (a tag split across two chunks)
+    for size in range(min(len(text), len(tag) - 1), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+# --- STREAM SPLITTER ---
+class MetaStreamSplitter:
+    # Splits a streamed model response into story text (shown as it arrives) and <META> blocks (held back)
+
+    def __init__(self):
+        self.story = ""
+        self.meta_blocks = []
+        self._buffer = ""
+        self._meta = ""
+        self._in_meta = False
+
+    @property
+    def meta_closed(self):
+        return len(self.meta_blocks) > 0
+
+    def feed(self, chunk):
+        # Returns the part of the story that can be shown now
+        self._buffer += chunk
+        visible = ""
+
+        while self._buffer:
+            if not self._in_meta:
+                index = self._buffer.find(META_OPEN)
+                if index >= 0:
+                    visible += self._buffer[:index]
+                    self._buffer = self._buffer[index + len(META_OPEN):]
+                    self._in_meta = True
+                    continue
+                # Hold back anything that might be the start of "<META>"
+                keep = _partial_tag_length(self._buffer, META_OPEN)
+                visible += self._buffer[:len(self._buffer) - keep]
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                break
+            else:
+                index = self._buffer.find(META_CLOSE)
+                if index >= 0:
+                    self.meta_blocks.append(self._meta + self._buffer[:index])
+                    self._meta = ""
+                    self._buffer = self._buffer[index + len(META_CLOSE):]
+                    self._in_meta = False
+                    continue
+                keep = _partial_tag_length(self._buffer, META_CLOSE)
+                self._meta += self._buffer[:len(self._buffer) - keep]
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                break
+
+        self.story += visible
+        return visible
+
+    def close(self):
+        # End of stream: a dangling partial tag is just story text, an unclosed META block is dropped
+        visible = ""
+        if not self._in_meta:
+            visible = self._buffer
+            self.story += visible
+        self._buffer = ""
+        self._meta = ""
+        self._in_meta = False
+        return visible
+
+    def updates(self):
+        # Validated updates from the first META block: (updates, [problems])
+        if not self.meta_blocks:
+            return {}, []
+        return parse_meta(self.meta_blocks[0])
+
+
+# --- META SCHEMA ---
+# Every field the narrator may send, and what its value must look like
+META_SCHEMA = {
+    "health": "int",
+    "gold": "int",
+    "xp": "int",
+    "inventory_add": "str_list",
+    "inventory_remove": "str_list",
+    "equip": "str_dict",
+    "unequip": "str_list",
+    # New enemies ({"name": ..., "level": ...} or just names) and enemies that left the fight
+    "enemies": "enemy_list",
+    "enemies_remove": "str_list",
+}
+
+_decoder = json.JSONDecoder()
+
+
+def _validate(field, value):
+    # Returns (valid value, None) or (None, problem)
+    kind = META_SCHEMA[field]
+    if kind == "int":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None, f"{field} should be a number"
+        return int(value), None
+    if kind == "str_list":
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return None, f"{field} should be a list"
+        return [item for item in value if isinstance(item, str) and item.strip()], None
+    if kind == "enemy_list":
+        if isinstance(value, (str, dict)):
+            value = [value]
+        if not isinstance(value, list):
+            return None, f"{field} should be a list"
+        enemies = []
+        for item in value:
+            if isinstance(item, str):
+                item = {"name": item}
+            if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+                continue
+            level = item.get("level")
+            valid_level = isinstance(level, (int, float)) and not isinstance(level, bool)
+            enemies.append({"name": item["name"], "level": int(level) if valid_level else None})
+        return enemies, None
+    if not isinstance(value, dict):
+        return None, f"{field} should be an object"
+    return {k: v for k, v in value.items() if isinstance(v, str) and v.strip()}, None
+
+
+def _repair(text):
+    # Common model mistakes: "+5" numbers, trailing commas, single quotes
+    text = re.sub(r"(:\s*)\+(\d)", r"\1\2", text)
+    text = re.sub(r",\s*([\]}])", r"\1", text)
+    return text.replace("'", '"') if '"' not in text else text
+
+
+def _recover_fields(text):
+    # Field by field: decode the value after every known key, so one broken field doesn't lose the others.
+    # Only keys of the outer object count: an enemy's "health" inside "enemies" is not the player's health
+    found = {}
+    top_depth = 1 if text.lstrip().startswith("{") else 0
+    # Open brackets at the current position; a closer pops down to its own opener, so a missing "}" in an enemy
+    # entry doesn't push the rest of the block down a level
+    open_brackets, in_string, escaped, position = [], False, False, 0
+    for match in re.finditer(r"[\"']?(\w+)[\"']?\s*:\s*", text):
+        # Bracket depth at the key, not counting brackets inside strings (which end at a line break at the latest)
+        for char in text[position:match.start()]:
+            if in_string:
+                if char == "\n":
+                    in_string = escaped = False
+                elif escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                open_brackets.append(char)
+            elif char in "}]":
+                opener = "{" if char == "}" else "["
+                if opener in open_brackets:
+                    while open_brackets.pop() != opener:
+                        pass
+        position = match.start()
+
+        field = match.group(1)
+        if in_string or len(open_brackets) != top_depth or field not in META_SCHEMA or field in found:
+            continue
+        try:
+            value, _ = _decoder.raw_decode(text, match.end())
+        except json.JSONDecodeError:
+            number = re.match(r"[+-]?\d+", text[match.end():])
+            if number is None:
+                continue
+            value = int(number.group(0))
+        found[field] = value
+    return found
+
+
+def parse_meta(block):
+    # Validate a META block against META_SCHEMA; returns (updates, [problems])
+    problems = []
+    try:
+        raw = json.loads(block)
+    except json.JSONDecodeError:
+        try:
+            raw = json.loads(_repair(block))
+        except json.JSONDecodeError:
+            raw = _recover_fields(_repair(block))
+            problems.append("invalid JSON, recovered the readable fields")
+
+    if not isinstance(raw, dict):
+        return {}, problems + ["META is not a JSON object"]
+
+    updates = {}
+    for field, value in raw.items():
+        if field not in META_SCHEMA:
+            continue
+        valid, problem = _validate(field, value)
+        if problem:
+            problems.append(problem)
+        else:
+            updates[field] = valid
+    return updates, problems
@@ -0,0 +1,134 @@
+import importlib
+import json
+import random
+import time
+from item_stats import item_stat_boosts, items_by_slot
+
+
+# Local stand-ins for the Gemini narrator: same interface as ModelClient (generate(prompt) -> text,
+# stream(prompt) -> chunks), no network and no API key. Used by simulate.py and anything else that
+# wants to run the engine without the model.
+
+
+def chunk_text(text, size=16):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# --- CANNED NARRATOR ---
+CANNED_RESPONSES = [
+    'A goblin leaps from the bushes, dagger raised. What do you do? <META>{"health": -8, "xp": 5}</META>',
+    'You find a small pouch of coins under a rotten log. Where do you go next? <META>{"gold": 7}</META>',
+    'The mysterious figure hands you a worn blade. Will you take it? <META>{"inventory_add": ["Iron Sword"], "xp": 3}</META>',
+    'You strap the blade to your side and feel stronger. What now? <META>{"equip": {"right_hand": "Iron Sword"}}</META>',
+    'A quiet path winds deeper into the forest. Do you follow it? <META>{}</META>',
+]
+
+
+class CannedNarrator:
+    # Cycles through a fixed list of responses (each with its own META block)
+
+    def __init__(self, responses=None, delay=0.0):
+        self.responses = list(responses or CANNED_RESPONSES)
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        response = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return response
+
+    def stream(self, prompt):
+        return iter(chunk_text(self.generate(prompt)))
+
+
+# --- TEMPLATE NARRATOR ---
+ENEMIES = ["goblin", "wolf", "skeleton", "bandit", "giant spider", "cultist", "troll", "wraith"]
+PLACES = ["a mossy clearing", "a collapsed crypt", "a narrow ravine", "an abandoned camp", "a flooded cellar", "a ruined tower"]
+STORY_TEMPLATES = [
+    "A {enemy} steps out of {place}, eyes fixed on you.",
+    "You press on into {place}; somewhere ahead a {enemy} growls.",
+    "The {enemy} staggers back, wounded, and the air smells of ash.",
+    "In {place} you spot something glinting between the stones.",
+    "The fight leaves you breathing hard, but the {enemy} is gone.",
+    "Faint runes glow on the walls of {place}.",
+]
+QUESTIONS = ["What do you do?", "Do you press on?", "Will you fight or flee?", "Where do you go next?"]
+EQUIP_SLOTS = {
+    "right_hand": "right_hand", "left_hand": "left_hand", "helmet": "helmet", "chestplate": "chestplate",
+    "leggings": "leggings", "boots": "boots", "accessory": "accessory_1",
+}
+
+
+class TemplateNarrator:
+    # Story sentences from templates plus a random META block: damage, healing, gold, xp, items found,
+    # gear equipped or taken off, new enemies, and now and then a malformed block (exercises the META recovery)
+
+    def __init__(self, seed=None, delay=0.0, broken_meta_rate=0.05):
+        self.random = random.Random(seed)
+        self.delay = delay
+        self.broken_meta_rate = broken_meta_rate
+        self.items = list(item_stat_boosts)
+        self.calls = 0
+
+    def random_meta(self):
+        rng = self.random
+        meta = {}
+        if rng.random() < 0.5:
+            meta["health"] = rng.randint(-20, 10)
+        if rng.random() < 0.3:
+            meta["gold"] = rng.randint(1, 15)
+        if rng.random() < 0.6:
+            meta["xp"] = rng.randint(1, 12)
+        if rng.random() < 0.25:
+            meta["inventory_add"] = [rng.choice(self.items)]
+        if rng.random() < 0.15:
+            slot = rng.choice(list(items_by_slot))
+            meta["equip"] = {EQUIP_SLOTS[slot]: rng.choice(list(items_by_slot[slot]))}
+        if rng.random() < 0.05:
+            meta["unequip"] = [rng.choice(list(EQUIP_SLOTS.values()))]
+        if rng.random() < 0.05:
+            meta["inventory_remove"] = [rng.choice(self.items)]
+        if rng.random() < 0.2:
+            meta["enemies"] = [{"name": rng.choice(ENEMIES), "level": rng.randint(1, 3)}]
+        text = json.dumps(meta)
+        if rng.random() < self.broken_meta_rate:
+            # Typical model slips: a "+5" number and a trailing comma
+            text = text.replace(": ", ": +", 1).rstrip("}") + ",}"
+        return text
+
+    def story(self):
+        rng = self.random
+        sentences = [
+            rng.choice(STORY_TEMPLATES).format(enemy=rng.choice(ENEMIES), place=rng.choice(PLACES))
+            for _ in range(rng.randint(2, 4))
+        ]
+        return " ".join(sentences + [rng.choice(QUESTIONS)])
+
+    def generate(self, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        self.calls += 1
+        return f"{self.story()} <META>{self.random_meta()}</META>"
+
+    def stream(self, prompt):
+        return iter(chunk_text(self.generate(prompt)))
+
+
+# --- LOADING ---
+def load_narrator(spec, seed=None, delay=0.0):
+    # "template", "canned", "canned:responses.json" (a JSON list of responses) or "package.module:factory"
+    kind, _, argument = spec.partition(":")
+    if kind == "template":
+        return TemplateNarrator(seed=seed, delay=delay)
+    if kind == "canned":
+        responses = None
+        if argument:
+            with open(argument, "r") as f:
+                responses = json.load(f)
+        return CannedNarrator(responses, delay=delay)
+    if not argument:
+        raise ValueError(f"Unknown narrator: {spec}")
+    factory = getattr(importlib.import_module(kind), argument)
+    return factory()
@@ -0,0 +1,307 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from prompt_builder import get_story_model
+from story_memory import estimate_tokens
+
+try:
+    from google.api_core import exceptions as api_exceptions
+except ImportError:
+    # Only needed to talk to Gemini: headless runs with a local narrator work without it (see simulate.py)
+    api_exceptions = None
+
+
+# --- ERRORS ---
+class StoryGenerationError(Exception):
+    # Raised when the model could not produce a story within the deadline and retries
+    pass
+
+
+# Errors worth retrying: quota bursts, overloaded or unreachable backend, timeouts
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+if api_exceptions is not None:
+    TRANSIENT_ERRORS = (
+        api_exceptions.ResourceExhausted,
+        api_exceptions.TooManyRequests,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.InternalServerError,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.GatewayTimeout,
+    ) + TRANSIENT_ERRORS
+
+
+# Errors that mean the quota is used up: the scheduler pauses everyone for a moment
+QUOTA_ERRORS = ()
+if api_exceptions is not None:
+    QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+
+
+def is_transient_error(error):
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+# --- MODEL CLIENT ---
+class ModelClient:
+    # Long-lived wrapper around the story model: one model object (and gRPC channel) for the whole session,
+    # per-turn deadlines, retries with jittered backoff and optional hedged requests.
+    # generate/stream take an optional `usage` dict that gets this call's retries, errors, hedging and
+    # token counts (the client is shared by many sessions, so its own counters can't tell turns apart).
+    # With a `scheduler` (see request_scheduler.py) every request, retries and hedges included, first waits
+    # for its go; `session` and `priority` ("turn", "summary", "prefetch") decide its place in the queue.
+
+    reports_usage = True
+
+    def __init__(self, model_name, use_context_cache=False, cache_model_name=None, cache_ttl_minutes=60,
+                 deadline=30.0, max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 hedge_requests=False, hedge_min_samples=20, latency_window=200,
+                 scheduler=None, expected_output_tokens=400, max_concurrent=8):
+        self.model_name = model_name
+        self.use_context_cache = use_context_cache
+        self.cache_model_name = cache_model_name
+        self.cache_ttl_minutes = cache_ttl_minutes
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_requests = hedge_requests
+        self.hedge_min_samples = hedge_min_samples
+        self.scheduler = scheduler
+        self.expected_output_tokens = expected_output_tokens
+
+        self.latencies = deque(maxlen=latency_window)
+        self.retry_count = 0
+        self.error_count = 0
+        self.hedge_count = 0
+        self._lock = threading.Lock()
+        # Hedged requests run here, the first one and its hedge: room for every request that may be in flight at once
+        # (the scheduler's limit, or `max_concurrent` without one), so none waits in the pool and looks slow
+        in_flight = scheduler.max_concurrent if scheduler is not None else max_concurrent
+        self._executor = ThreadPoolExecutor(max_workers=2 * in_flight, thread_name_prefix="story-model")
+
+    def model(self):
+        # get_story_model keeps one model per (model, catalog version), so the connection is reused
+        return get_story_model(self.model_name, self.use_context_cache, self.cache_model_name, self.cache_ttl_minutes)
+
+    # --- LATENCY TRACKING ---
+    def _record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def latency_p95(self):
+        with self._lock:
+            if len(self.latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    # --- COUNTERS ---
+    # A hedge runs on another thread next to the first request, so the counters and the caller's usage dict
+    # are only updated under the lock
+    def _count(self, usage, field, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if usage is not None:
+                usage[field] = usage.get(field, 0) + 1
+
+    def _read_usage(self, response, usage):
+        with self._lock:
+            _read_usage(response, usage)
+
+    # --- BACKOFF ---
+    def _backoff(self, attempt, deadline_at):
+        # "Full jitter": sleep a random time up to the exponential cap, never past the deadline
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = min(random.uniform(0, cap), max(0.0, deadline_at - time.monotonic()))
+        time.sleep(delay)
+
+    def _remaining(self, deadline_at):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise StoryGenerationError("the narrator took too long to answer")
+        return remaining
+
+    # --- SCHEDULING ---
+    def _admit(self, prompt, deadline_at, usage, session, priority, timeout=None):
+        # Wait for the scheduler's go; returns its ticket (None without a scheduler)
+        if self.scheduler is None:
+            return None
+        remaining = self._remaining(deadline_at)
+        tokens = estimate_tokens(prompt) + self.expected_output_tokens
+        ticket = self.scheduler.acquire(session, priority, tokens, remaining if timeout is None else min(timeout, remaining))
+        if ticket is None:
+            raise StoryGenerationError("the narrator is too busy right now")
+        if usage is not None:
+            with self._lock:
+                usage["queue_ms"] = round(usage.get("queue_ms", 0) + ticket.waited * 1e3, 3)
+        return ticket
+
+    def _done(self, ticket, used_tokens=None, error=None):
+        if self.scheduler is None:
+            return
+        if isinstance(error, QUOTA_ERRORS):
+            self.scheduler.pause(self.backoff_base * 2)
+        self.scheduler.release(ticket, used_tokens)
+
+    # --- SINGLE REQUEST ---
+    def _request(self, prompt, deadline_at, usage=None, session=None, priority="turn", ticket=None):
+        # `ticket`: already admitted (hedges are admitted before they are submitted)
+        if ticket is None:
+            ticket = self._admit(prompt, deadline_at, usage, session, priority)
+        used_tokens = error = None
+        try:
+            start = time.monotonic()
+            response = self.model().generate_content(prompt, request_options={"timeout": self._remaining(deadline_at)})
+            text = response.text.strip()
+            self._record_latency(time.monotonic() - start)
+            self._read_usage(response, usage)
+            used_tokens = _total_tokens(response)
+            return text
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._done(ticket, used_tokens, error)
+
+    def _hedged_request(self, prompt, deadline_at, usage=None, session=None, priority="turn"):
+        p95 = self.latency_p95()
+        if not self.hedge_requests or p95 is None or p95 >= self._remaining(deadline_at):
+            return self._request(prompt, deadline_at, usage, session, priority)
+
+        # Fire the first request; if it is slower than p95, fire a second one and take whichever answers first.
+        # The p95 clock starts when the request really starts, not when it was handed to the pool.
+        started = threading.Event()
+
+        def first_request():
+            started.set()
+            return self._request(prompt, deadline_at, usage, session, priority)
+
+        first = self._executor.submit(first_request)
+        started.wait(self._remaining(deadline_at))
+        done, _ = wait([first], timeout=p95)
+        if done:
+            return first.result()
+
+        # A hedge is only sent if the scheduler has room for it right now
+        try:
+            hedge_ticket = self._admit(prompt, deadline_at, usage, session, priority, timeout=0)
+        except StoryGenerationError:
+            return first.result(timeout=self._remaining(deadline_at))
+        self._count(usage, "hedged", "hedge_count")
+        second = self._executor.submit(self._request, prompt, deadline_at, usage, session, priority, hedge_ticket)
+        last_error = None
+        try:
+            for future in as_completed([first, second], timeout=self._remaining(deadline_at)):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                # The losing request can't be cancelled once it runs, its answer is just ignored
+                return result
+        except TimeoutError:
+            raise StoryGenerationError("the narrator took too long to answer")
+        raise last_error
+
+    # --- PUBLIC API ---
+    def generate(self, prompt, deadline=None, usage=None, session=None, priority="turn"):
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            try:
+                return self._hedged_request(prompt, deadline_at, usage, session, priority)
+            except StoryGenerationError:
+                self._count(usage, "errors", "error_count")
+                raise
+            except Exception as e:
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    self._count(usage, "errors", "error_count")
+                    raise StoryGenerationError(str(e)) from e
+                attempt += 1
+                self._count(usage, "retries", "retry_count")
+                self._backoff(attempt, deadline_at)
+
+    def stream(self, prompt, deadline=None, usage=None, session=None, priority="turn"):
+        # Retries are only possible until the first chunk arrives; after that the text is already on screen
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            ticket = None
+            try:
+                ticket = self._admit(prompt, deadline_at, usage, session, priority)
+                start = time.monotonic()
+                response = self.model().generate_content(
+                    prompt, stream=True, request_options={"timeout": self._remaining(deadline_at)}
+                )
+                chunks = iter(response)
+                first_chunk = next(chunks, None)
+                break
+            except StoryGenerationError as e:
+                if ticket is not None:
+                    self._done(ticket, error=e)
+                self._count(usage, "errors", "error_count")
+                raise
+            except Exception as e:
+                if ticket is not None:
+                    self._done(ticket, error=e)
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    self._count(usage, "errors", "error_count")
+                    raise StoryGenerationError(str(e)) from e
+                attempt += 1
+                self._count(usage, "retries", "retry_count")
+                self._backoff(attempt, deadline_at)
+
+        used_tokens = error = None
+        try:
+            if first_chunk is not None:
+                self._read_usage(first_chunk, usage)
+                used_tokens = _total_tokens(first_chunk)
+                yield from _chunk_text(first_chunk)
+            for chunk in chunks:
+                # The last chunk with token counts has those of the whole response
+                self._read_usage(chunk, usage)
+                used_tokens = _total_tokens(chunk) or used_tokens
+                yield from _chunk_text(chunk)
+        except Exception as e:
+            error = e
+            self._count(usage, "errors", "error_count")
+            raise StoryGenerationError(str(e)) from e
+        finally:
+            # Also when the reader stops early (the generator is closed)
+            self._done(ticket, used_tokens, error)
+        self._record_latency(time.monotonic() - start)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _chunk_text(chunk):
+    # Chunks without text (e.g. only a finish reason) yield nothing
+    try:
+        text = chunk.text
+    except ValueError:
+        return
+    if text:
+        yield text
+
+
+# --- PER-CALL USAGE ---
+def _total_tokens(response):
+    metadata = getattr(response, "usage_metadata", None)
+    return getattr(metadata, "total_token_count", None) or None
+
+
+def _read_usage(response, usage):
+    # Token counts from the response's usage metadata, when the API sends them
+    metadata = getattr(response, "usage_metadata", None)
+    if usage is None or metadata is None:
+        return
+    for field, attribute in (
+        ("prompt_tokens", "prompt_token_count"),
+        ("response_tokens", "candidates_token_count"),
+        ("cached_tokens", "cached_content_token_count"),
+    ):
+        value = getattr(metadata, attribute, None)
+        if value:
+            usage[field] = value
@@ -0,0 +1,122 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from combat import pick_target
+from intent_parser import parse_intent
+
+
+# --- NEXT ACTION PREDICTION ---
+# Narrator questions that are usually answered with a plain yes or no ("Do you enter?")
+YES_NO_OPENERS = ("do you", "will you", "would you", "should you", "are you", "can you", "dare you", "shall you", "is it")
+COMBAT_WORDS = {
+    "enemy", "enemies", "attack", "attacks", "fight", "goblin", "goblins", "orc", "troll", "skeleton", "wolf", "wolves",
+    "beast", "creature", "monster", "bandit", "bandits", "dragon", "spider", "blade", "charges", "lunges", "snarls", "growls",
+}
+# Different ways of typing the same answer
+ACTION_SYNONYMS = {
+    "y": "yes", "yeah": "yes", "yep": "yes", "sure": "yes", "ok": "yes", "okay": "yes",
+    "n": "no", "nope": "no", "nah": "no",
+}
+
+
+def normalize_action(player_input):
+    # Lowercase, drop punctuation and extra spaces, map synonyms ("Yes!" -> "yes", "y" -> "yes")
+    words = re.sub(r"[^\w\s']", " ", player_input.lower()).split()
+    text = " ".join(words)
+    return ACTION_SYNONYMS.get(text, text)
+
+
+def intent_key(player_input, combat=None):
+    # What a prefetched turn is matched on: the parsed actions, spells and items, and the enemy they are aimed at,
+    # so "attack the goblin" uses the narration prefetched for "attack" while the goblin is the one an attack hits.
+    # Inputs without any of those ("yes", "no") are matched on their normalized text.
+    intent = parse_intent(player_input)
+    if not (intent["actions"] or intent["spells"] or intent["items"]):
+        return normalize_action(player_input)
+    targets = [target.lower() for target in intent["targets"]]
+    if combat is not None and combat["enemies"]:
+        enemy = pick_target(combat["enemies"], targets)
+        target = enemy["name"] if enemy else None
+    else:
+        target = tuple(targets)
+    return tuple(intent["actions"]), tuple(intent["spells"]), tuple(intent["items"]), target
+
+
+def predict_next_actions(narration, max_candidates=3):
+    # Guess the few answers a player is most likely to type to the narrator's last line
+    text = narration.strip()
+    candidates = []
+
+    if text.endswith("?"):
+        sentences = re.split(r"(?<=[.!?])\s+", text)
+        question = sentences[-1].lower() if sentences else ""
+        if question.startswith(YES_NO_OPENERS):
+            candidates += ["yes", "no"]
+
+    words = set(re.findall(r"[a-z]+", text.lower()))
+    if words & COMBAT_WORDS:
+        candidates += ["attack", "defend", "run"]
+
+    return candidates[:max_candidates]
+
+
+# --- SPECULATIVE PREFETCH ---
+class SpeculativePrefetcher:
+    # Generates narrations for likely next actions in the background while the player is reading.
+    # Results are keyed by a fingerprint of the game state they were built from, so a result is only
+    # used if the player's real input matches a candidate AND nothing else changed in between.
+    # `key` turns an input into what is matched (see intent_key); candidates with the same key are prefetched once.
+
+    def __init__(self, generate, max_candidates=3, budget_ratio=2.0, budget_allowance=6, max_workers=3, key=normalize_action):
+        self.generate = generate
+        self.key = key
+        self.max_candidates = max_candidates
+        # Speculative requests may not exceed budget_ratio x real turns (+ a small allowance to get started)
+        self.budget_ratio = budget_ratio
+        self.budget_allowance = budget_allowance
+        self.real_turns = 0
+        self.speculative_requests = 0
+        self.hits = 0
+        self.misses = 0
+        self._state_key = None
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="story-prefetch")
+
+    def budget_left(self):
+        return int(self.real_turns * self.budget_ratio + self.budget_allowance) - self.speculative_requests
+
+    def start(self, state_key, candidate_prompts):
+        # candidate_prompts: {candidate action: prompt}; replaces anything speculated for an older state
+        self.discard()
+        self._state_key = state_key
+        for candidate, prompt in list(candidate_prompts.items())[:self.max_candidates]:
+            if self.budget_left() <= 0:
+                break
+            key = self.key(candidate)
+            if key in self._futures:
+                continue
+            self.speculative_requests += 1
+            self._futures[key] = self._executor.submit(self.generate, prompt)
+
+    def take(self, state_key, player_input):
+        # Returns the future for a matching candidate (finished or still running), or None on a miss
+        self.real_turns += 1
+        future = None
+        if state_key == self._state_key:
+            future = self._futures.pop(self.key(player_input), None)
+        if future is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.discard()
+        return future
+
+    def discard(self):
+        # Not-yet-started speculation is cancelled, running requests finish and are ignored
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+        self._state_key = None
+
+    def close(self):
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,163 @@
+import datetime
+import hashlib
+import json
+import threading
+from item_stats import item_stat_boosts
+from magic_spells import magic_spells
+
+try:
+    import google.generativeai as genai
+    from google.generativeai import caching
+    from google.api_core import exceptions as api_exceptions
+except ImportError:
+    # Only needed to talk to Gemini: prompts can be built without it (see simulate.py)
+    genai = caching = api_exceptions = None
+
+
+# --- PROMPT CACHE STATE ---
+# The static prefix only depends on the item and spell catalogs, so it is built once per catalog version
+_static_prompt = {"version": None, "text": None}
+# Cached-content handles on the API side (and the model bound to them), keyed by (model name, catalog version)
+_cached_contents = {}
+# Keys for which the API refused to create a cache for good
+_cache_refused = set()
+# One cache creation at a time, so sessions starting together don't each upload the prefix
+_cache_lock = threading.Lock()
+# Models bound to the static prefix as a system instruction (fallback when caching is off or refused)
+_story_models = {}
+
+
+# --- CATALOG VERSION ---
+def catalog_version():
+    # Hash the catalogs so a changed item or spell list gets a new prefix (and a new cache handle)
+    payload = json.dumps([item_stat_boosts, magic_spells], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# --- STATIC PROMPT PREFIX ---
+def build_static_prompt():
+    # Rules, item list and spell list: everything that does not change between turns
+    return (
+        "You are a fantasy dungeon-master AI. "
+        "Continue the adventure in a vivid, immersive style. "
+        "Do not repeat the player's action. Keep it concise (max 5 sentences). "
+        "Make it interactive, try and end the output with a question so that the player can react to it. "
+        "After the story, provide any game state updates (health, gold, inventory, xp, enemies) in this JSON format:\n"
+        "`<META>{\"health\": -10, \"gold\": +5, \"xp\": 10, \"inventory_add\": [\"amulet\"], \"inventory_remove\": [\"torch\"], \"equip\": {\"right_hand\": \"iron sword\"}, \"unequip\": [\"helmet\"], \"enemies\": [{\"name\": \"goblin\", \"level\": 2}], \"enemies_remove\": [\"wolf\"]}</META>`\n"
+        "If no update is needed, just write `<META>{}</META>`.\n"
+        "Always wrap game state updates in <META>...</META> tags. Do NOT output raw JSON outside of these tags."
+        "The JSON must be syntactically valid — it should pass a JSON parser without error.\n"
+        "You can only add items from this list: "
+        f"{list(item_stat_boosts.keys())}.\n"
+        "**Any item meant for equipping must clearly correspond to one of these slots: `left_hand`, `right_hand`, `helmet`, `chestplate`, `leggings`, `boots`, `accessory_1`, or `accessory_2`.**\n"
+        "Make sure equipped items are placed in the correct slot in the `equip` field of the JSON.\n"
+        "All JSON keys and string values must be in double quotes to ensure valid JSON.\n\n"
+
+        "Combat is resolved by the game, not by you. When an enemy joins a fight, add it to `enemies` with a level that fits the story; "
+        "enemies on the \"Enemies still fighting\" line are already in the fight, never add them again. "
+        "when an enemy flees or gives up, list it in `enemies_remove`. "
+        "When the turn has an Outcome line, those attacks, spells, damage, healing and defeated enemies already happened: narrate exactly that outcome, "
+        "and do not repeat its damage, healing, xp or gold in META. "
+        "For other harm (traps, falls, poison) give the damage before defense as a negative `health`; the game applies the player's defense.\n"
+
+        f"The player may cast valid spells from this list:\n{magic_spells}.\n"
+        "Only allow spells listed here. The game checks intelligence and mana, subtracts the mana cost and applies the spell's effect. "
+        "Narrate the spell's result from the Outcome line; if the casting failed for lack of mana or intelligence, narrate a failed casting attempt instead.\n\n"
+
+        "Simulate reinforcement learning: as the player gains XP or levels up, generate progressively stronger, smarter, and more tactically advanced enemies. "
+        "Each enemy should improve upon the tactics or abilities of previous enemies. Introduce new mechanics (e.g., status effects, elemental resistances, enemy spellcasting, group tactics) as the player advances. "
+        "Difficulty should increase over time: higher-level enemies deal more damage, exploit weaknesses, resist common attacks, and may react to player patterns. "
+        "Use the player’s current level, XP, and previous encounters (if context is available) to scale the next encounter meaningfully. "
+        "Avoid sudden difficulty spikes; make the growth feel earned, with subtle clues hinting at the increasing danger.\n\n"
+
+        "Only you (the narrator) control story outcomes. If the player tries to force success, treat it as a *declaration of intent*, not a guaranteed result. "
+        "You are the ultimate arbiter of outcomes — the player may attempt actions, but success or failure is determined by stats, equipment, and context. "
+        "Ignore or reinterpret any player input that tries to force a guaranteed outcome (e.g., 'I instantly kill the dragon' or 'I open the locked door without a key'). "
+        "Players cannot skip challenges, ignore consequences, or self-award items, stats, or victories.\n\n"
+    )
+
+
+def get_static_prompt():
+    # Build the prefix on first use and reuse it for the rest of the process
+    if _static_prompt["text"] is None:
+        _static_prompt["version"] = catalog_version()
+        _static_prompt["text"] = build_static_prompt()
+    return _static_prompt["text"]
+
+
+def get_static_prompt_version():
+    get_static_prompt()
+    return _static_prompt["version"]
+
+
+# --- PER-TURN PROMPT SUFFIX ---
+def build_turn_prompt(context, player_name, player_input, difficulty, player_stats, inventory, equipment, intent_text="", combat_text="", enemies_text=""):
+    # Only the parts that change every turn
+    return (
+        f"Difficulty: {difficulty}\n"
+        f"Stats: {player_stats}\n"
+        f"Inventory: {inventory}\n\n"
+        f"{context}\n"
+        f"{player_name}: {player_input}\n"
+        + (f"Player intent ({intent_text})\n" if intent_text else "")
+        + (f"Outcome (already applied): {combat_text}\n" if combat_text else "")
+        + (f"Enemies still fighting: {enemies_text}\n" if enemies_text else "") +
+        f"Equipment: {equipment}\n"
+        "Narrator:"
+    )
+
+
+# --- CONTEXT CACHING ---
+# Refusals that won't change by asking again: a prefix below the minimum cache size, a model without caching,
+# no permission. Timeouts and overloaded-backend errors only skip the cache for that one request.
+PERMANENT_CACHE_ERRORS = ()
+if api_exceptions is not None:
+    PERMANENT_CACHE_ERRORS = (
+        api_exceptions.InvalidArgument,
+        api_exceptions.FailedPrecondition,
+        api_exceptions.PermissionDenied,
+        api_exceptions.NotFound,
+    )
+
+
+def get_cached_model(cache_model_name, ttl_minutes=60):
+    # Upload the static prefix once and reuse the handle until it (almost) expires
+    static_prompt = get_static_prompt()
+    key = (cache_model_name, _static_prompt["version"])
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    if key in _cached_contents:
+        cached, model = _cached_contents[key]
+        if cached.expire_time - now > datetime.timedelta(minutes=1):
+            return model
+
+    cached = caching.CachedContent.create(
+        model=cache_model_name,
+        display_name=f"dungeon-ai-prefix-{_static_prompt['version']}",
+        system_instruction=static_prompt,
+        ttl=datetime.timedelta(minutes=ttl_minutes),
+    )
+    model = genai.GenerativeModel.from_cached_content(cached_content=cached)
+    _cached_contents[key] = (cached, model)
+    return model
+
+
+def get_story_model(model_name, use_context_cache=False, cache_model_name=None, ttl_minutes=60):
+    key = (model_name, get_static_prompt_version())
+
+    # Prefer a model that references the uploaded prefix by handle
+    if use_context_cache and key not in _cache_refused:
+        try:
+            with _cache_lock:
+                return get_cached_model(cache_model_name or model_name, ttl_minutes)
+        except PERMANENT_CACHE_ERRORS:
+            # Caching needs a versioned model name and a minimum prefix size, don't ask again if it is refused
+            _cache_refused.add(key)
+        except Exception:
+            # Transient: send the prefix uncached this time and try the cache again next request
+            pass
+
+    # Otherwise send the prefix as a system instruction; the caller only sends the turn suffix
+    if key not in _story_models:
+        _story_models[key] = genai.GenerativeModel(model_name, system_instruction=get_static_prompt())
+    return _story_models[key]
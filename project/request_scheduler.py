@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Central gate in front of the model API, shared by every session of a process:
+# - token buckets for the requests-per-minute and tokens-per-minute quotas (tokens are estimated up front
+#   and corrected with the real counts when the response says how many were used)
+# - at most `max_concurrent` requests in flight
+# - fair queuing: waiting requests are served by priority, and round-robin across sessions within a priority,
+#   so one busy player can't starve the others
+# - background work (story summaries, speculative prefetch) only starts while turns are not waiting and
+#   leaves `background_reserve` of the quota free for turns; it gives up after a short wait (it has a fallback)
+# - a quota error pauses everyone for a moment instead of letting every waiting request run into it too
+
+# Lower number = served first
+PRIORITIES = {"turn": 0, "summary": 1, "prefetch": 2}
+
+# Longest wait in the queue before giving up, per priority (turns wait until their own deadline)
+DEFAULT_MAX_WAIT = {"turn": None, "summary": 30.0, "prefetch": 2.0}
+
+
+# --- TOKEN BUCKET ---
+class TokenBucket:
+    # `per_minute` units refill continuously, up to one minute's worth
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now, keep=0.0):
+        # Seconds until `amount` can be taken while leaving `keep` in the bucket (requests larger than
+        # the whole bucket only wait for a full bucket)
+        self._refill(now)
+        needed = min(amount + keep, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount):
+        # May go below zero (a large request, or a correction): later requests then wait for the debt
+        self.level -= amount
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+# --- SCHEDULER ---
+class Ticket:
+    __slots__ = ("session", "priority", "tokens", "queued_at", "waited")
+
+    def __init__(self, session, priority, tokens):
+        self.session = session
+        self.priority = priority
+        self.tokens = tokens
+        self.queued_at = time.monotonic()
+        self.waited = 0.0
+
+
+class RequestScheduler:
+    # acquire() before every request, release() after it; thread safe
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrent=8, background_reserve=0.25, max_wait=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrent = max_concurrent
+        self.background_reserve = background_reserve
+        self.max_wait = dict(DEFAULT_MAX_WAIT, **(max_wait or {}))
+        self.active = 0
+        # One queue per priority: session -> waiting tickets (oldest first); sessions take turns
+        self._queues = [OrderedDict() for _ in PRIORITIES]
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        # priority -> {"granted", "shed", "wait_seconds"}
+        self.stats = {name: {"granted": 0, "shed": 0, "wait_seconds": 0.0} for name in PRIORITIES}
+
+    # --- QUEUES ---
+    def _enqueue(self, ticket):
+        self._queues[PRIORITIES[ticket.priority]].setdefault(ticket.session, deque()).append(ticket)
+
+    def _dequeue(self, ticket, served):
+        queue = self._queues[PRIORITIES[ticket.priority]]
+        waiting = queue[ticket.session]
+        waiting.remove(ticket)
+        if not waiting:
+            del queue[ticket.session]
+        elif served:
+            # Round-robin: this session goes behind the others that are waiting
+            queue.move_to_end(ticket.session)
+
+    def _head(self):
+        for queue in self._queues:
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _wait_time(self, ticket, now):
+        # 0 if `ticket` can start now, else seconds until a bucket refills (None: wait for a release)
+        background = ticket.priority != "turn"
+        slots = self.max_concurrent - (int(self.max_concurrent * self.background_reserve) if background else 0)
+        if self.active >= max(1, slots):
+            return None
+        requests_keep = self.requests.capacity * self.background_reserve if background else 0.0
+        tokens_keep = self.tokens.capacity * self.background_reserve if background else 0.0
+        return max(
+            self._paused_until - now,
+            self.requests.wait_time(1, now, requests_keep),
+            self.tokens.wait_time(ticket.tokens, now, tokens_keep),
+            0.0,
+        )
+
+    # --- PUBLIC API ---
+    def acquire(self, session, priority, tokens, timeout=None):
+        # Blocks until the request may be sent; returns a ticket for release(), or None if it waited
+        # longer than `timeout` (or its priority's max wait) and should not be sent at all
+        max_wait = self.max_wait.get(priority)
+        if max_wait is not None:
+            timeout = max_wait if timeout is None else min(timeout, max_wait)
+        ticket = Ticket(session, priority, tokens)
+        with self._condition:
+            self._enqueue(ticket)
+            deadline = None if timeout is None else ticket.queued_at + timeout
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._head() is ticket:
+                    wait = self._wait_time(ticket, now)
+                    if wait == 0:
+                        self._dequeue(ticket, served=True)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.active += 1
+                        ticket.waited = now - ticket.queued_at
+                        self.stats[priority]["granted"] += 1
+                        self.stats[priority]["wait_seconds"] += ticket.waited
+                        # The next ticket in line may be able to start too
+                        self._condition.notify_all()
+                        return ticket
+                if deadline is not None and now >= deadline:
+                    self._dequeue(ticket, served=False)
+                    self.stats[priority]["shed"] += 1
+                    self._condition.notify_all()
+                    return None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._condition.wait(wait)
+
+    def release(self, ticket, used_tokens=None):
+        # used_tokens: what the response says it really used, to correct the estimate
+        with self._condition:
+            self.active -= 1
+            if used_tokens:
+                difference = ticket.tokens - used_tokens
+                if difference > 0:
+                    self.tokens.give_back(difference)
+                else:
+                    self.tokens.take(-difference)
+            self._condition.notify_all()
+
+    def use_share(self, fraction):
+        # Keep to `fraction` of the quota (worker processes split it between them); call before any request
+        with self._condition:
+            self.requests = TokenBucket(self.requests.capacity * fraction)
+            self.tokens = TokenBucket(self.tokens.capacity * fraction)
+            self.max_concurrent = max(1, round(self.max_concurrent * fraction))
+
+    def pause(self, seconds):
+        # After a quota error: nobody starts a request for `seconds`
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def waiting(self):
+        with self._condition:
+            return sum(len(tickets) for queue in self._queues for tickets in queue.values())
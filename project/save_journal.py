@@ -0,0 +1,217 @@
+import json
+import os
+
+
+# Parts of the game state the journal writes as deltas
+JOURNAL_FIELDS = (
+    "context", "game_memory", "memory_start", "player_stats", "inventory", "difficulty", "equipment",
+    "memory_passages", "memory_passages_length",
+)
+
+
+# --- SAVE JOURNAL ---
+class SaveJournal:
+    # Save backend that appends one small record per turn (new narration + changed state) to a journal
+    # and only rewrites the full snapshot every `snapshot_every` turns.
+    # The snapshot keeps the old savegame.json format, so older saves still load.
+
+    def __init__(self, save_file, snapshot_every=20, fsync=True):
+        self.save_file = save_file
+        self.journal_file = os.path.splitext(save_file)[0] + ".journal.jsonl"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self._last = None
+
+    # --- SAVE ---
+    def save(self, state, force_snapshot=False):
+        # state: {"context", "game_memory", "player_stats", "inventory", "difficulty", "equipment"}
+        self.seq += 1
+        if force_snapshot or self._last is None or self.records_since_snapshot >= self.snapshot_every:
+            self.write_snapshot(state)
+        else:
+            self._append(self._delta(state))
+            self.records_since_snapshot += 1
+        self._remember(state)
+
+    def write_snapshot(self, state):
+        # Write to a temp file and rename, then start an empty journal
+        data = dict(state)
+        if "memory_passages_length" in data:
+            data["memory_passages"] = data["memory_passages"][:data.pop("memory_passages_length")]
+        data["journal_seq"] = self.seq
+        temp_file = self.save_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_file, self.save_file)
+        # Records up to journal_seq are in the snapshot; if we crash before truncating, load() skips them
+        open(self.journal_file, "w").close()
+        self.records_since_snapshot = 0
+
+    def _append(self, record):
+        with open(self.journal_file, "a") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    # --- DELTAS ---
+    def _remember(self, state):
+        # Cheap copies of what was last persisted (strings are immutable, the rest is small)
+        memory = state["game_memory"]
+        passages, passages_length = passages_of(state)
+        self._last = {
+            "context": state["context"],
+            "memory_start": state.get("memory_start", 0),
+            "memory_length": len(memory),
+            "passages_length": passages_length,
+            "passages_tail": passages[passages_length - 1] if passages_length else None,
+            "player_stats": dict(state["player_stats"]),
+            "inventory": list(state["inventory"]),
+            "difficulty": state["difficulty"],
+            "equipment": dict(state["equipment"]),
+            "extra": {k: v for k, v in state.items() if k not in JOURNAL_FIELDS},
+        }
+
+    def _delta(self, state):
+        last = self._last
+        record = {"seq": self.seq}
+
+        # Story text normally only grows, so only the new part is written
+        context = state["context"]
+        if context.startswith(last["context"]):
+            if len(context) > len(last["context"]):
+                record["context_append"] = context[len(last["context"]):]
+        else:
+            record["context"] = context
+
+        # game_memory is capped: entries may have been dropped at the front and added at the end.
+        # memory_start numbers the entries, so the counts come from positions (narrations can repeat word for word)
+        memory = state["game_memory"]
+        start = state.get("memory_start", 0)
+        end = start + len(memory)
+        last_start = last["memory_start"]
+        last_end = last_start + last["memory_length"]
+        if start < last_start or end < last_end or start > last_end:
+            # The history was replaced (or nothing persisted is left): write it whole
+            record["game_memory"] = memory
+            record["memory_start"] = start
+        else:
+            if start > last_start:
+                record["memory_drop"] = start - last_start
+            if end > last_end:
+                record["memory_append"] = memory[last_end - start:]
+
+        # The recall index's passages only grow too (see memory_index.py), unless the story was replaced
+        passages, passages_length = passages_of(state)
+        length = last["passages_length"]
+        if passages_length >= length and (length == 0 or passages[length - 1] == last["passages_tail"]):
+            if passages_length > length:
+                record["passages_append"] = passages[length:passages_length]
+        else:
+            record["memory_passages"] = passages[:passages_length]
+
+        stats = state["player_stats"]
+        last_stats = last["player_stats"]
+        changed_stats = {k: v for k, v in stats.items() if k not in last_stats or last_stats[k] != v}
+        if changed_stats:
+            record["stats"] = changed_stats
+        removed_stats = [k for k in last_stats if k not in stats]
+        if removed_stats:
+            record["stats_removed"] = removed_stats
+
+        if state["inventory"] != last["inventory"]:
+            record["inventory"] = state["inventory"]
+        changed_slots = {k: v for k, v in state["equipment"].items() if last["equipment"].get(k) != v}
+        if changed_slots:
+            record["equipment"] = changed_slots
+        if state["difficulty"] != last["difficulty"]:
+            record["difficulty"] = state["difficulty"]
+
+        # Any other (small) parts of the save, e.g. the story memory summaries, are written whole when changed
+        changed_extra = {k: v for k, v in state.items() if k not in JOURNAL_FIELDS and last["extra"].get(k) != v}
+        if changed_extra:
+            record["extra"] = changed_extra
+        return record
+
+    # --- LOAD ---
+    def exists(self):
+        return os.path.exists(self.save_file)
+
+    def load(self):
+        # Latest snapshot + every journal record written after it
+        if not self.exists():
+            return None
+        with open(self.save_file, "r") as f:
+            state = json.load(f)
+        snapshot_seq = state.pop("journal_seq", 0)
+        self.seq = snapshot_seq
+        self.records_since_snapshot = 0
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash mid-append: everything before it is still valid,
+                        # and the next save compacts into a snapshot so nothing is appended after it
+                        self.records_since_snapshot = self.snapshot_every
+                        break
+                    if record.get("seq", 0) <= snapshot_seq:
+                        continue
+                    apply_journal_record(state, record)
+                    self.seq = record["seq"]
+                    self.records_since_snapshot += 1
+
+        self._remember(state)
+        return state
+
+    def delete(self):
+        for path in (self.save_file, self.journal_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self._last = None
+
+
+def passages_of(state):
+    # The session passes the recall index's live (append-only) passage list plus how many of them this save covers
+    passages = state.get("memory_passages", [])
+    return passages, state.get("memory_passages_length", len(passages))
+
+
+def apply_journal_record(state, record):
+    if "context" in record:
+        state["context"] = record["context"]
+    if "context_append" in record:
+        state["context"] += record["context_append"]
+    if "game_memory" in record:
+        state["game_memory"] = record["game_memory"]
+        state["memory_start"] = record.get("memory_start", 0)
+    if "memory_drop" in record:
+        del state["game_memory"][:record["memory_drop"]]
+        state["memory_start"] = state.get("memory_start", 0) + record["memory_drop"]
+    if "memory_append" in record:
+        state["game_memory"].extend(record["memory_append"])
+    if "memory_passages" in record:
+        state["memory_passages"] = record["memory_passages"]
+    if "passages_append" in record:
+        state.setdefault("memory_passages", []).extend(record["passages_append"])
+    if "stats" in record:
+        state["player_stats"].update(record["stats"])
+    for key in record.get("stats_removed", []):
+        state["player_stats"].pop(key, None)
+    if "inventory" in record:
+        state["inventory"] = record["inventory"]
+    if "equipment" in record:
+        state["equipment"].update(record["equipment"])
+    if "difficulty" in record:
+        state["difficulty"] = record["difficulty"]
+    if "extra" in record:
+        state.update(record["extra"])
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from item_stats import item_stat_boosts
+from magic_spells import magic_spells
+from game_logic import ALLOCATABLE_STATS
+from game_engine import GameSession
+from mock_narrator import load_narrator
+from stage_timings import StageTimings
+from memory_profile import MemoryProfiler, session_sources
+
+
+# Headless batch playthroughs: new game -> turns (turn costs, prompt, narrator, META, level up, memory, save)
+# with a local narrator instead of Gemini, to measure the engine's own overhead per stage.
+#
+#   python simulate.py --games 1000 --turns 50
+#   python simulate.py --narrator canned --script inputs.txt --json results.json
+#   python simulate.py --narrator my_module:make_narrator --latency-ms 200
+#   python simulate.py --games 1 --turns 5000 --memory-profile 250
+#   python simulate.py --narrator canned --turns 200 --check-saves 10
+
+
+# --- PLAYER INPUTS ---
+ACTION_TEMPLATES = [
+    "I attack the {enemy}",
+    "I run from the {enemy}",
+    "I defend against the {enemy}",
+    "I dodge the {enemy}'s strike",
+    "I cast {spell} at the {enemy}",
+    "I equip the {item}",
+    "I look around",
+    "I search the area for loot",
+    "I talk to the stranger",
+    "I rest for a moment",
+]
+ENEMY_NAMES = ["goblin", "wolf", "skeleton", "bandit", "troll"]
+
+
+def random_action(rng):
+    return rng.choice(ACTION_TEMPLATES).format(
+        enemy=rng.choice(ENEMY_NAMES),
+        spell=rng.choice(list(magic_spells)),
+        item=rng.choice(list(item_stat_boosts)),
+    )
+
+
+def load_script(path):
+    # One player input per line; the script repeats if a playthrough has more turns than lines
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def quick_summary(prompt):
+    # Story summaries run on a background thread; a fixed reply keeps seeded runs reproducible
+    return "SUMMARY: The adventure goes on through the dark forest.\nFACTS:\n- The forest is dangerous."
+
+
+# --- PLAYTHROUGH ---
+class StageTelemetry:
+    # Telemetry sink for GameSession: adds the stages each turn's TurnRecord measured (input, prompt, model, meta,
+    # state, save, render; see game_engine.py) to the StageTimings
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def record(self, turn_record):
+        for stage, seconds in turn_record.stages.items():
+            self.timings.add(stage, seconds)
+
+
+class SaveMismatch(Exception):
+    pass
+
+
+def check_save(session, memory_executor):
+    # Load the save into a fresh session and compare it with the live game; returns the parts that differ
+    session.flush()
+    loaded = GameSession(session.narrator, session.save_journal.save_file, summarize=quick_summary, memory_executor=memory_executor)
+    loaded.load()
+    expected, actual = session.state.to_save_dict(), loaded.state.to_save_dict()
+    differences = [field for field in expected if expected[field] != actual[field]]
+    if loaded.memory_index.passages != session.memory_index.passages:
+        differences.append("memory_passages")
+    return differences
+
+
+def play_through(index, args, narrator, timings, rng, save_dir, memory_executor, script, memory_profiler=None):
+    session = GameSession(
+        narrator, os.path.join(save_dir, f"sim_{index}.json"), player_name=f"Sim{index}",
+        summarize=quick_summary, memory_executor=memory_executor, telemetry=StageTelemetry(timings),
+        memory_profiler=memory_profiler,
+    )
+    if memory_profiler is not None:
+        memory_profiler.add_sources(session_sources(session))
+    session.save_journal.fsync = args.fsync
+
+    difficulty = args.difficulty or rng.choice(["Easy", "Medium", "Hard"])
+    with timings.measure("new_game"):
+        session.new_game(difficulty)
+
+    turns = 0
+    while turns < args.turns:
+        if session.state.awaiting_stat_allocation:
+            with timings.measure("allocate"):
+                session.allocate_stat(rng.choice(ALLOCATABLE_STATS))
+            continue
+
+        player_input = script[turns % len(script)] if script else random_action(rng)
+        with timings.measure("turn"):
+            session.play_turn(player_input)
+        turns += 1
+
+        if args.check_saves and turns % args.check_saves == 0:
+            with timings.measure("check_save"):
+                differences = check_save(session, memory_executor)
+            if differences:
+                raise SaveMismatch(f"game {index}, turn {turns}: the loaded save differs in {', '.join(differences)}")
+
+    session.close()
+    return turns
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    narrator = load_narrator(args.narrator, seed=args.seed, delay=args.latency_ms / 1000)
+    script = load_script(args.script) if args.script else None
+    timings = StageTimings()
+    save_dir = args.save_dir or tempfile.mkdtemp(prefix="dungeon-sim-")
+    os.makedirs(save_dir, exist_ok=True)
+    memory_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="story-memory")
+    # Growth per turn only means something within one game: use it with --games 1 and many turns
+    memory_profiler = MemoryProfiler(args.memory_profile) if args.memory_profile else None
+
+    started = time.perf_counter()
+    total_turns = 0
+    try:
+        for index in range(args.games):
+            total_turns += play_through(index, args, narrator, timings, rng, save_dir, memory_executor, script, memory_profiler)
+    finally:
+        elapsed = time.perf_counter() - started
+        memory_executor.shutdown(wait=True)
+        if not args.save_dir:
+            shutil.rmtree(save_dir, ignore_errors=True)
+
+    if memory_profiler is not None:
+        path = memory_profiler.write_report(args.memory_report)
+        print(memory_profiler.format_summary())
+        print(f"💾 Memory report saved to {path}")
+        memory_profiler.close()
+
+    engine_seconds = elapsed - timings.total("model") - timings.total("check_save")
+    return {
+        "config": {
+            "games": args.games, "turns": args.turns, "narrator": args.narrator, "seed": args.seed,
+            "difficulty": args.difficulty, "latency_ms": args.latency_ms, "fsync": args.fsync, "script": args.script,
+            "check_saves": args.check_saves,
+        },
+        "turns": total_turns,
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_second": round(total_turns / elapsed, 1) if elapsed else None,
+        # Without the narrator's own time: what the engine costs per turn
+        "engine_turns_per_second": round(total_turns / engine_seconds, 1) if engine_seconds > 0 else None,
+        "engine_us_per_turn": round(engine_seconds / total_turns * 1e6, 1) if total_turns else None,
+        "stages": timings.report(),
+    }, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless Dungeon AI playthroughs with a local narrator")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=50, help="turns per playthrough")
+    parser.add_argument("--narrator", default="template", help='"template", "canned", "canned:file.json" or "module:factory"')
+    parser.add_argument("--script", help="file with one player input per line (default: random inputs)")
+    parser.add_argument("--difficulty", choices=["Easy", "Medium", "Hard"], help="default: random per playthrough")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated narrator latency")
+    parser.add_argument("--fsync", action="store_true", help="fsync every save like the real game")
+    parser.add_argument("--save-dir", help="keep the save files here (default: a temp dir that is removed)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--memory-profile", type=int, metavar="N", help="sample memory with tracemalloc every N turns (slow)")
+    parser.add_argument("--memory-report", help="memory report file (default: memory_reports/memory-<date-time>.json)")
+    parser.add_argument("--check-saves", type=int, metavar="N", help="every N turns, load the save and compare it with the game")
+    parser.add_argument("--fail-above-us", type=float, help="exit with 1 if the engine takes longer per turn (regression check)")
+    args = parser.parse_args()
+
+    try:
+        results, timings = run(args)
+    except SaveMismatch as e:
+        print(f"❌ Save check failed: {e}")
+        sys.exit(1)
+    print(f"{results['turns']} turns in {results['elapsed_s']} s: {results['turns_per_second']} turns/s, "
+          f"engine only {results['engine_turns_per_second']} turns/s ({results['engine_us_per_turn']} us/turn)")
+    print(timings.format_table())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.fail_above_us is not None and results["engine_us_per_turn"] > args.fail_above_us:
+        print(f"❌ Engine overhead {results['engine_us_per_turn']} us/turn is above {args.fail_above_us} us/turn")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+from item_stats import items_by_slot, item_slots
+
+
+# --- SLOT KEYWORDS ---
+# Hand-picked words for item names the model invents, on top of the words taken from the catalog
+EXTRA_SLOT_KEYWORDS = {
+    "right_hand": ["sword", "dagger", "mace", "axe", "blade", "stick", "staff", "spear", "whip", "wand", "bow", "hammer", "club", "scimitar", "rapier", "katana", "halberd"],
+    "left_hand": ["shield", "buckler", "torch", "lamp", "lantern", "torchlight"],
+    "helmet": ["helmet", "helm", "hood", "cap", "mask", "headgear", "crown", "headpiece", "hat", "cowl", "circlet", "headband"],
+    "chestplate": ["chestplate", "armor", "armour", "robe", "shirt", "tunic", "vest", "plate", "body armor", "cuirass", "cloak", "breastplate", "mail"],
+    "leggings": ["leggings", "pants", "greaves", "trousers", "shorts", "skirt", "bottoms"],
+    "boots": ["boots", "shoes", "sandals", "footwear", "slippers", "sneakers", "kicks"],
+    "accessory": ["ring", "amulet", "necklace", "charm", "locket", "brooch", "bracelet", "trinket", "talisman", "pendant", "earring", "gemstone", "jewel", "band"],
+}
+
+
+def tokenize_name(name):
+    return re.findall(r"[a-z]+", name.lower())
+
+
+def head_noun(name):
+    # "Boots of Speed" -> "boots", "Mage's Robe" -> "robe": the last word before " of "
+    words = tokenize_name(re.split(r"\bof\b", name.lower(), maxsplit=1)[0])
+    return words[-1] if words else None
+
+
+def build_keyword_trie():
+    # Word-level trie: {"body": {"armor": {None: "chestplate"}}, "sword": {None: "right_hand"}, ...}
+    votes = {}
+    for slot, items in items_by_slot.items():
+        for item in items:
+            noun = head_noun(item)
+            if noun:
+                votes.setdefault((noun,), {}).setdefault(slot, 0)
+                votes[(noun,)][slot] += 1
+    for slot, keywords in EXTRA_SLOT_KEYWORDS.items():
+        for keyword in keywords:
+            words = tuple(keyword.split())
+            votes.setdefault(words, {}).setdefault(slot, 0)
+            votes[words][slot] += 1
+
+    trie = {}
+    for words, slot_votes in votes.items():
+        node = trie
+        for word in words:
+            node = node.setdefault(word, {})
+        # A word the catalog uses for several slots goes to the slot that uses it most
+        node[None] = max(slot_votes, key=slot_votes.get)
+    return trie
+
+
+# --- CLASSIFIER ---
+# Built once from the catalog
+EXACT_SLOTS = {item.lower(): slot for item, slot in item_slots.items()}
+KEYWORD_TRIE = build_keyword_trie()
+
+
+def _match_at(words, start):
+    # Longest keyword starting at words[start] -> (slot, length) or (None, 0)
+    node = KEYWORD_TRIE
+    match = (None, 0)
+    for length, word in enumerate(words[start:], 1):
+        next_node = node.get(word)
+        if next_node is None and word.endswith("s"):
+            # Plural of a keyword ("swords", "helmets")
+            next_node = node.get(word[:-1])
+        if next_node is None:
+            break
+        node = next_node
+        if None in node:
+            match = (node[None], length)
+    return match
+
+
+def _scan(words):
+    # One pass over the words; the last keyword wins (the head noun comes last in "Iron Plated Boots")
+    slot = None
+    i = 0
+    while i < len(words):
+        found, length = _match_at(words, i)
+        if found:
+            slot = found
+            i += length
+        else:
+            i += 1
+    return slot
+
+
+@lru_cache(maxsize=4096)
+def classify_item_slot(item_name):
+    # Returns "right_hand", "left_hand", "helmet", "chestplate", "leggings", "boots", "accessory" or None
+    name = item_name.strip().lower()
+    if name in EXACT_SLOTS:
+        return EXACT_SLOTS[name]
+
+    # Unknown name: look at the part before " of " first ("Robe of Focus"), then at the rest ("Band of Light")
+    head, _, tail = name.partition(" of ")
+    return _scan(tokenize_name(head)) or _scan(tokenize_name(tail))
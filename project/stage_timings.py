@@ -0,0 +1,56 @@
+import time
+from contextlib import contextmanager
+
+
+# --- STAGE TIMINGS ---
+class StageTimings:
+    # Wall-clock samples per named stage ("prompt", "save", ...), summarized as count/total/mean/p50/p95/max
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, stage, function):
+        # Wrap `function` so every call is measured as `stage`
+        def wrapper(*args, **kwargs):
+            with self.measure(stage):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def total(self, stage):
+        return sum(self.samples.get(stage, ()))
+
+    def report(self):
+        # {stage: {"count", "total_ms", "mean_us", "p50_us", "p95_us", "max_us"}}
+        report = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            count = len(ordered)
+            report[stage] = {
+                "count": count,
+                "total_ms": round(sum(ordered) * 1e3, 3),
+                "mean_us": round(sum(ordered) / count * 1e6, 2),
+                "p50_us": round(ordered[count // 2] * 1e6, 2),
+                "p95_us": round(ordered[min(count - 1, int(count * 0.95))] * 1e6, 2),
+                "max_us": round(ordered[-1] * 1e6, 2),
+            }
+        return report
+
+    def format_table(self):
+        lines = [f"{'stage':<14}{'calls':>10}{'total ms':>12}{'mean us':>11}{'p50 us':>11}{'p95 us':>11}{'max us':>11}"]
+        for stage, row in self.report().items():
+            lines.append(
+                f"{stage:<14}{row['count']:>10}{row['total_ms']:>12.1f}{row['mean_us']:>11.1f}"
+                f"{row['p50_us']:>11.1f}{row['p95_us']:>11.1f}{row['max_us']:>11.1f}"
+            )
+        return "\n".join(lines)
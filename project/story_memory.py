@@ -0,0 +1,196 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# --- TOKEN ESTIMATE ---
+def estimate_tokens(text):
+    # Rough estimate (about 4 characters per token), good enough to keep the prompt under a budget
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max(0, max_tokens * 4)
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+# --- SUMMARY PROMPTS ---
+def build_summary_prompt(previous_summary, new_text):
+    return (
+        "You keep the memory of a fantasy dungeon adventure.\n"
+        "Merge the previous summary and the new events into one short summary (max 6 sentences). "
+        "Keep names of characters, places and items, promises, enemies and unresolved quests.\n"
+        "Then list the key facts the narrator must not forget, one per line starting with '- '.\n"
+        "Answer in exactly this format:\nSUMMARY: <summary>\nFACTS:\n- <fact>\n\n"
+        f"Previous summary:\n{previous_summary or '(none)'}\n\n"
+        f"New events:\n{new_text}\n"
+    )
+
+
+def parse_summary(text):
+    # Returns (summary, [facts]); a reply without the expected format is used as the summary as a whole
+    match = re.search(r"SUMMARY:\s*(.*?)(?:\n\s*FACTS:|$)", text, re.DOTALL)
+    summary = match.group(1).strip() if match else text.strip()
+    facts_part = text.split("FACTS:", 1)[1] if "FACTS:" in text else ""
+    facts = [line.strip()[2:].strip() for line in facts_part.splitlines() if line.strip().startswith("- ")]
+    return summary, facts
+
+
+def keep_last_tokens(text, max_tokens):
+    # Like truncate_to_tokens, but keeps the end (the newest part of a summary)
+    max_chars = max(0, max_tokens * 4)
+    if len(text) <= max_chars:
+        return text
+    return "..." + text[-max_chars:].split(" ", 1)[-1]
+
+
+def extractive_summary(entries):
+    # Fallback when the summarizer is unavailable: the first sentence of every narration
+    sentences = []
+    for entry in entries:
+        first = re.split(r"(?<=[.!?])\s+", entry.strip(), maxsplit=1)[0]
+        if first:
+            sentences.append(first)
+    return " ".join(sentences)
+
+
+# --- STORY MEMORY ---
+class StoryMemory:
+    # Hierarchical memory for long sessions:
+    # - the newest game_memory entries are kept verbatim (game_memory is capped at `memory_cap`)
+    # - older entries are folded in the background into chapter summaries (`fold_size` entries each)
+    # - old chapters are folded again into one saga summary, so the memory stays small forever
+    # - key facts from the summaries are kept as a short list
+    # build_context() assembles facts + summaries + recent turns within a token budget.
+
+    def __init__(self, summarize, memory_cap=40, fold_size=10, max_chapters=4, max_facts=15, max_saga_tokens=400, executor=None):
+        # summarize(prompt) -> text; may be slow, it only runs on the background thread
+        # executor: a pool shared by many games (see game_engine.py); by default each memory gets its own thread
+        self.summarize = summarize
+        self.memory_cap = memory_cap
+        self.fold_size = fold_size
+        self.max_chapters = max_chapters
+        self.max_facts = max_facts
+        self.max_saga_tokens = max_saga_tokens
+        self.saga = ""
+        self.chapters = []
+        self.facts = []
+        self.unfolded = []
+        self._lock = threading.Lock()
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="story-memory")
+        self._folding = None
+
+    # --- CAPPING GAME MEMORY ---
+    def trim(self, game_memory):
+        # Move everything above the cap out of game_memory (in place) and fold it in the background.
+        # Returns how many entries were dropped from the front.
+        overflow = max(0, len(game_memory) - self.memory_cap)
+        if overflow:
+            with self._lock:
+                self.unfolded.extend(game_memory[:overflow])
+            del game_memory[:overflow]
+
+        if self._folding is None or self._folding.done():
+            with self._lock:
+                # A big backlog (e.g. an old uncapped save) is condensed locally instead of with many model calls
+                backlog = len(self.unfolded) - self.fold_size * 3
+                if backlog > 0:
+                    condensed = " ".join([self.saga, extractive_summary(self.unfolded[:backlog])]).strip()
+                    self.saga = keep_last_tokens(condensed, self.max_saga_tokens)
+                    del self.unfolded[:backlog]
+            if len(self.unfolded) >= self.fold_size:
+                self._folding = self._executor.submit(self._fold)
+        return overflow
+
+    def _fold(self):
+        with self._lock:
+            entries = self.unfolded[:self.fold_size]
+        new_text = "\n".join(entries)
+        try:
+            summary, facts = parse_summary(self.summarize(build_summary_prompt("", new_text)))
+        except Exception:
+            summary, facts = extractive_summary(entries), []
+
+        with self._lock:
+            del self.unfolded[:len(entries)]
+            self.chapters.append(summary)
+            self._add_facts(facts)
+            old_chapters = self.chapters[:-self.max_chapters] if len(self.chapters) > self.max_chapters else []
+            previous_saga = self.saga
+
+        if old_chapters:
+            # Second level: old chapters go into the saga summary
+            try:
+                saga, facts = parse_summary(self.summarize(build_summary_prompt(previous_saga, "\n".join(old_chapters))))
+            except Exception:
+                saga, facts = " ".join([previous_saga] + old_chapters).strip(), []
+            with self._lock:
+                self.saga = keep_last_tokens(saga, self.max_saga_tokens)
+                del self.chapters[:len(old_chapters)]
+                self._add_facts(facts)
+
+        # Keep folding if more entries piled up meanwhile
+        if len(self.unfolded) >= self.fold_size:
+            self._fold()
+
+    def _add_facts(self, facts):
+        for fact in facts:
+            if fact and fact not in self.facts:
+                self.facts.append(fact)
+        # Newest facts win when the list is full
+        del self.facts[:-self.max_facts]
+
+    def wait(self):
+        if self._folding is not None:
+            self._folding.result()
+
+    # --- PROMPT CONTEXT ---
+    def build_context(self, game_memory, token_budget):
+        # Facts (<= 20% of the budget), summaries (<= 35%), then as many recent entries as still fit
+        with self._lock:
+            facts = list(self.facts)
+            summaries = [s for s in [self.saga] + self.chapters if s]
+            unfolded = list(self.unfolded)
+
+        parts = []
+        used = 0
+        if facts:
+            facts_text = truncate_to_tokens("Key facts:\n" + "\n".join(f"- {f}" for f in facts), token_budget // 5)
+            parts.append(facts_text)
+            used += estimate_tokens(facts_text)
+        if summaries or unfolded:
+            # Entries that are not folded yet still count as story, in their cheap extractive form
+            summary_text = " ".join(summaries + ([extractive_summary(unfolded)] if unfolded else []))
+            summary_text = "Story so far: " + keep_last_tokens(summary_text, token_budget * 7 // 20 - 4)
+            parts.append(summary_text)
+            used += estimate_tokens(summary_text)
+
+        recent = []
+        for entry in reversed(game_memory):
+            cost = estimate_tokens(entry)
+            if used + cost > token_budget:
+                if not recent:
+                    # Never go over the budget, not even for the newest entry
+                    recent.append(keep_last_tokens(entry, token_budget - used))
+                break
+            recent.append(entry)
+            used += cost
+        parts.append("\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
+    # --- SAVE / LOAD ---
+    def to_dict(self):
+        with self._lock:
+            return {"saga": self.saga, "chapters": list(self.chapters), "facts": list(self.facts), "unfolded": list(self.unfolded)}
+
+    def load(self, data):
+        with self._lock:
+            self.saga = data.get("saga", "")
+            self.chapters = list(data.get("chapters", []))
+            self.facts = list(data.get("facts", []))
+            self.unfolded = list(data.get("unfolded", []))
+
+    def reset(self):
+        self.load({})
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+
+# Per-turn telemetry: where the time of every turn went (input parsing, prompt, model, META, state, save,
+# render), prompt/response sizes, token counts and retries. Each turn is one line in a rotating JSONL log
+# and is added to in-process metrics that can be read in Prometheus text format (the server's GET /metrics).
+
+# Stages of a turn, in order
+TURN_STAGES = ("input", "prompt", "model", "meta", "state", "save", "render")
+
+# Histogram buckets in seconds: from sub-millisecond game logic up to slow model calls
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# --- TURN RECORD ---
+class TurnRecord:
+    # Timings and facts of one turn; carried in the turn dict from GameSession.begin_turn to record_turn
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.ttft = None
+        # Filled in by ModelClient when the narrator is the real model: retries, errors, hedged, token counts
+        self.usage = {}
+        self.data = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def first_token(self, model_started):
+        # Time to the first story chunk, counted from the start of the model call
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - model_started
+
+    def to_dict(self):
+        result = {
+            "time": round(time.time(), 3),
+            "turn_ms": round((time.perf_counter() - self.started) * 1e3, 3),
+            "stages_ms": {stage: round(seconds * 1e3, 3) for stage, seconds in self.stages.items()},
+            "ttft_ms": None if self.ttft is None else round(self.ttft * 1e3, 3),
+        }
+        result.update(self.data)
+        result.update(self.usage)
+        return result
+
+
+# --- METRICS ---
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class TurnMetrics:
+    # Counters and histograms over all recorded turns. snapshot() is a plain picklable dict, so worker
+    # processes can send theirs to the parent and merge() adds them up.
+
+    def __init__(self):
+        self.counters = {}
+        # key -> [bucket counts..., sum, count]
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = [0] * len(SECONDS_BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(SECONDS_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def record(self, turn):
+        # turn: TurnRecord.to_dict()
+        with self._lock:
+            self.inc("dungeon_turns_total", outcome="error" if turn.get("error") else "ok")
+            self.observe("dungeon_turn_seconds", turn["turn_ms"] / 1e3)
+            for stage, ms in turn["stages_ms"].items():
+                self.observe("dungeon_turn_stage_seconds", ms / 1e3, stage=stage)
+            if turn.get("ttft_ms") is not None:
+                self.observe("dungeon_model_ttft_seconds", turn["ttft_ms"] / 1e3)
+            for field, name in (
+                ("prompt_chars", "dungeon_prompt_chars_total"),
+                ("response_chars", "dungeon_response_chars_total"),
+                ("prompt_tokens", "dungeon_prompt_tokens_total"),
+                ("response_tokens", "dungeon_response_tokens_total"),
+                ("cached_tokens", "dungeon_cached_tokens_total"),
+                ("retries", "dungeon_model_retries_total"),
+                ("errors", "dungeon_model_errors_total"),
+            ):
+                if turn.get(field):
+                    self.inc(name, turn[field])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {key: list(values) for key, values in self.histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in snapshot["histograms"].items():
+                histogram = self.histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    histogram[i] += value
+
+
+METRIC_HELP = {
+    "dungeon_turns_total": ("counter", "Turns played, by outcome."),
+    "dungeon_turn_seconds": ("histogram", "Wall time of a whole turn."),
+    "dungeon_turn_stage_seconds": ("histogram", "Wall time of each stage of a turn."),
+    "dungeon_model_ttft_seconds": ("histogram", "Time from the model call to the first story chunk."),
+    "dungeon_prompt_chars_total": ("counter", "Characters sent to the narrator."),
+    "dungeon_response_chars_total": ("counter", "Characters received from the narrator."),
+    "dungeon_prompt_tokens_total": ("counter", "Prompt tokens reported by the model."),
+    "dungeon_response_tokens_total": ("counter", "Response tokens reported by the model."),
+    "dungeon_cached_tokens_total": ("counter", "Prompt tokens served from the context cache."),
+    "dungeon_model_retries_total": ("counter", "Model requests retried after a transient error."),
+    "dungeon_model_errors_total": ("counter", "Model calls that failed for good."),
+}
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def prometheus_text(snapshot):
+    # Prometheus text exposition format (version 0.0.4)
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        if kind == "counter":
+            series = sorted((key[1], value) for key, value in snapshot["counters"].items() if key[0] == name)
+        else:
+            series = sorted((key[1], values) for key, values in snapshot["histograms"].items() if key[0] == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            for bound, count in zip(SECONDS_BUCKETS, value):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {value[-2]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# --- TELEMETRY ---
+def shard_log_file(log_file, shard):
+    # One log per worker process: telemetry/turns.jsonl -> telemetry/turns.shard-1.jsonl
+    base, extension = os.path.splitext(log_file)
+    return f"{base}.shard-{shard}{extension}"
+
+
+class Telemetry:
+    # Shared by every session of a process: metrics in memory, one JSON line per turn in `log_file`
+    # (rotated at `max_bytes`, keeping `backup_count` old files). No log_file: metrics only.
+
+    def __init__(self, log_file=None, max_bytes=5_000_000, backup_count=5):
+        self.metrics = TurnMetrics()
+        self._log = None
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+            self._log = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def record(self, turn_record):
+        turn = turn_record.to_dict()
+        self.metrics.record(turn)
+        if self._log is not None:
+            # handle() takes the handler's lock, so lines from different turn threads never interleave
+            self._log.handle(logging.makeLogRecord({"msg": json.dumps(turn, separators=(",", ":"))}))
+        return turn
+
+    def prometheus(self):
+        return prometheus_text(self.metrics.snapshot())
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
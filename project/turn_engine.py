@@ -0,0 +1,65 @@
+import asyncio
+import inspect
+
+
+# --- TURN ENGINE ---
+class TurnEngine:
+    # Per-session queue of player submissions, processed strictly one after the other.
+    # `turn_handler` is an async (or plain) function taking the player input; it never runs twice at once.
+    # Works on any running asyncio loop: the Jupyter kernel's loop, or asyncio.run() in a script/server.
+
+    def __init__(self, turn_handler, on_busy=None, on_idle=None, on_error=None):
+        self.turn_handler = turn_handler
+        self.on_busy = on_busy
+        self.on_idle = on_idle
+        self.on_error = on_error
+        self.queue = asyncio.Queue()
+        self.busy = False
+        self._worker_task = None
+
+    @property
+    def pending(self):
+        # Submissions waiting behind the one being processed
+        return self.queue.qsize()
+
+    def submit(self, player_input):
+        # Queue the input and return a future with the handler's result; must be called on the loop
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put_nowait((player_input, future))
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = loop.create_task(self._worker())
+        return future
+
+    async def drain(self):
+        # Wait until everything submitted so far has been processed
+        if self._worker_task is not None:
+            await self._worker_task
+
+    async def _worker(self):
+        while not self.queue.empty():
+            player_input, future = self.queue.get_nowait()
+            self.busy = True
+            self._notify(self.on_busy, player_input)
+            try:
+                result = self.turn_handler(player_input)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                if self.on_error is not None:
+                    self._notify(self.on_error, e)
+                if not future.cancelled():
+                    future.set_exception(e)
+                    # The caller may not await the future (e.g. a button click), don't warn about it
+                    future.exception()
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.busy = False
+                self.queue.task_done()
+        self._notify(self.on_idle)
+
+    def _notify(self, callback, *args):
+        if callback is not None:
+            callback(*args)